@@ -1,55 +1,118 @@
+import hashlib
+import io
+import os
+
 import streamlit as st
 import trimesh
 import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
 
+from volume_calculator import load_material_catalog, mass_table
+
 # =====================
 # Materials & densities
 # =====================
-MATERIALS = {
-    "PLA": 1.250, "PETG": 1.270, "ABS": 1.020, "Resin": 1.200, "TPU (Rubber-like)": 1.200,
-    "Polyamide_SLS": 0.950, "Polyamide_MJF": 1.010, "Plexiglass": 1.180, "Alumide": 1.360,
-    "Carbon Steel": 7.800, "Steel": 7.860, "Aluminum": 2.698, "Titanium": 4.410,
-    "Brass": 8.600, "Bronze": 9.000, "Copper": 9.000, "Silver": 10.260,
-    "Gold_14K": 13.600, "Gold_18K": 15.600, "3k CFRP": 1.790, "Red Oak": 5.700
-}
+# Same catalog as the CLI: built-in list, or $VOLUME_CALCULATOR_MATERIALS
+# (parsed once per process and reused across reruns)
+MATERIALS = load_material_catalog(os.environ.get("VOLUME_CALCULATOR_MATERIALS"))
 
 # =====================
 # Compute model details
 # =====================
+# Streamlit reruns the whole script on every widget change, so parsing and
+# geometry are memoized by upload content hash; only the mass table is rebuilt.
+def upload_digest(file):
+    digests = st.session_state.setdefault("upload_digests", {})
+    file_id = getattr(file, "file_id", None) or f"{file.name}:{file.size}"
+    if file_id not in digests:
+        digests[file_id] = hashlib.sha256(file.getvalue()).hexdigest()
+    return digests[file_id]
+
+@st.cache_resource(show_spinner="Loading mesh...", max_entries=32)
+def load_mesh(digest, ext, _data):
+    return trimesh.load(io.BytesIO(_data), file_type=ext, force="mesh")
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def mesh_metrics(digest, ext, _data):
+    mesh = load_mesh(digest, ext, _data)
+    return {
+        "triangles": len(mesh.faces),
+        "bounds": (mesh.bounding_box.extents / 10.0).tolist(),  # mm → cm
+        "surface_area": mesh.area / 100.0,  # mm² → cm²
+        "volume": mesh.volume / 1000.0,  # mm³ → cm³
+    }
+
 def calculate_model_data(file, ext, infill=1.0):
-    mesh = trimesh.load(file, file_type=ext, force="mesh")
+    digest = upload_digest(file)
+    data = file.getvalue()
+    mesh = load_mesh(digest, ext, data)
+    metrics = mesh_metrics(digest, ext, data)
     file_size = file.size / 1024  # KB
-    triangles = len(mesh.faces)
-    bounds = mesh.bounding_box.extents / 10.0  # mm → cm
-    surface_area = mesh.area / 100.0  # mm² → cm²
-    volume = mesh.volume / 1000.0  # mm³ → cm³
+    bounds = metrics["bounds"]
+    volume = metrics["volume"]
 
     model_info = {
         "File Size": f"{file_size:.2f} KB",
-        "Triangles": triangles,
+        "Triangles": metrics["triangles"],
         "Bounding Box (cm)": f"W: {bounds[0]:.2f}, D: {bounds[1]:.2f}, H: {bounds[2]:.2f}",
-        "Surface Area": f"{surface_area:.4f} cm²",
+        "Surface Area": f"{metrics['surface_area']:.4f} cm²",
         "Volume (solid)": f"{volume:.4f} cm³",
     }
 
-    rows = []
-    for i, (mat, density) in enumerate(MATERIALS.items(), start=1):
-        mass_100 = volume * density
-        mass_infill = mass_100 * infill
-        rows.append([i, mat, density, mass_infill, mass_100])
-
-    df = pd.DataFrame(
-        rows,
-        columns=["ID", "Material", "Density", f"Mass @{infill*100:.1f}% (g)", "Mass @100% (g)"]
-    )
+    masses = mass_table(volume, MATERIALS.densities, (infill * 100.0, 100.0))[0]
+    df = pd.DataFrame({
+        "ID": MATERIALS.ids,
+        "Material": MATERIALS.names,
+        "Density": MATERIALS.densities,
+        f"Mass @{infill*100:.1f}% (g)": masses[:, 0],
+        "Mass @100% (g)": masses[:, 1],
+    })
     return mesh, model_info, df
 
+# =====================
+# Level of detail for the viewer
+# =====================
+DEFAULT_FACE_BUDGET = 200_000
+
+def decimate_for_display(mesh, face_budget):
+    """Vertex-clustering simplification to at most ~face_budget faces. Display only: measurements use the full mesh."""
+    if len(mesh.faces) <= face_budget:
+        return mesh
+    vertices = np.asarray(mesh.vertices)
+    lower = vertices.min(axis=0)
+    # A surface cell of size h holds about two triangles
+    cell = np.sqrt(2.0 * mesh.area / face_budget)
+    for _ in range(12):
+        keys = np.floor((vertices - lower) / cell).astype(np.int64)
+        _, cluster, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        cluster = cluster.reshape(-1)
+        merged = np.zeros((len(counts), 3))
+        np.add.at(merged, cluster, vertices)
+        merged /= counts[:, None]
+
+        faces = cluster[mesh.faces]
+        keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+        faces = faces[keep]
+        # Collapsed clusters often produce the same triangle several times
+        _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+        faces = faces[np.sort(first)]
+        if len(faces) <= face_budget:
+            break
+        cell *= 1.25
+    return trimesh.Trimesh(vertices=merged, faces=faces, process=False)
+
+@st.cache_resource(show_spinner="Simplifying mesh for display...", max_entries=64)
+def display_mesh(digest, face_budget, _mesh):
+    return decimate_for_display(_mesh, face_budget)
+
 # =====================
 # 3D Visualization with manual measuring arrows
 # =====================
-def plot_stl_with_arrows(mesh, material_name, mass_value, color_by="z", measure_lines=[]):
+def plot_stl_with_arrows(mesh, material_name, mass_value, color_by="z", measure_lines=[], lod_mesh=None):
+    # lod_mesh is a simplified copy of mesh that is drawn instead of the full-resolution faces
+    if lod_mesh is not None:
+        mesh = lod_mesh
     vertices = mesh.vertices
     faces = mesh.faces
     x, y, z = vertices[:, 0], vertices[:, 1], vertices[:, 2]
@@ -121,8 +184,13 @@ with col1:
 
     infill_percent = st.slider("Select infill percentage (%)", 0, 100, 100, 5)
     infill = infill_percent / 100.0
+    face_budget = st.number_input(
+        "Viewer face budget", 1_000, 5_000_000, DEFAULT_FACE_BUDGET, 10_000,
+        help="Larger meshes are simplified to about this many faces for display. Measurements always use the full mesh."
+    )
 
     all_meshes = {}
+    all_digests = {}
     all_model_info = {}
     all_mass_dfs = {}
     measure_lines_dict = {}
@@ -135,6 +203,7 @@ with col1:
 
             mesh, model_info, mass_df = calculate_model_data(uploaded_file, ext, infill)
             all_meshes[uploaded_file.name] = mesh
+            all_digests[uploaded_file.name] = upload_digest(uploaded_file)
             all_model_info[uploaded_file.name] = model_info
             all_mass_dfs[uploaded_file.name] = mass_df
 
@@ -164,8 +233,12 @@ with col2:
                 with row_cols[c]:
                     st.write(f"**{file_name}**")
                     # Per-file material selection
-                    selected_material = st.selectbox(f"Select Material ({file_name})", MATERIALS.keys(), key=f"mat_{file_name}")
+                    selected_material = st.selectbox(f"Select Material ({file_name})", MATERIALS.names, key=f"mat_{file_name}")
                     stress_option = st.radio(f"Color by ({file_name}):", ["z","curvature","distance"], key=f"stress_{file_name}")
+                    full_detail = st.checkbox(f"Full detail ({file_name})", value=False, key=f"full_{file_name}")
+                    lod_mesh = None if full_detail else display_mesh(all_digests[file_name], face_budget, mesh)
+                    shown_faces = len(mesh.faces) if lod_mesh is None else len(lod_mesh.faces)
+                    st.caption(f"Displaying {shown_faces:,} of {len(mesh.faces):,} faces")
                     mass_value = all_mass_dfs[file_name].loc[
                         all_mass_dfs[file_name]["Material"] == selected_material,
                         "Mass @100% (g)"
@@ -174,7 +247,7 @@ with col2:
                     st.plotly_chart(
                         plot_stl_with_arrows(
                             mesh, selected_material, mass_value,
-                            stress_option, measure_lines_dict[file_name]
+                            stress_option, measure_lines_dict[file_name], lod_mesh
                         ),
                         use_container_width=True
                     )
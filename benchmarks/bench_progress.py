@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+'''
+Cost of drawing progress bars during `STLUtils.analyze`, as a share of runtime.
+
+Each file is analyzed with the bar disabled and with a real tqdm bar drawn to
+a fake terminal, interleaved so drift affects both equally ("delta"). That
+end-to-end difference is within timing noise, so the budget is checked against
+the bar alone: creating it, one update per read chunk and closing it ("bar
+only"), relative to the quiet runtime. Files that fit in one read chunk finish
+before a bar is worth drawing, so none is created.
+
+Usage: python benchmarks/bench_progress.py [--facets 1000 100000 1000000] [--repeat 7] [--budget-pct 1.0]
+
+Exits non-zero when the overhead of any file exceeds the budget.
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from volume_calculator import ASCII_READ_BLOCK, READ_CHUNK_FACETS, STLUtils  # noqa: E402
+from benchmarks.meshes import write_ascii_stl, write_binary_stl  # noqa: E402
+
+
+class FakeTerminal:
+    """stderr replacement that claims to be a TTY and discards what tqdm writes."""
+    def __init__(self):
+        self.sink = open(os.devnull, 'w')
+
+    def isatty(self):
+        return True
+
+    def write(self, text):
+        return self.sink.write(text)
+
+    def flush(self):
+        self.sink.flush()
+
+
+def random_triangles(facets, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-100.0, 100.0, (facets, 3, 3)).astype(np.float32)
+
+
+def timed_analyze(path, show_progress):
+    utils = STLUtils(show_progress=show_progress)
+    start = time.perf_counter()
+    utils.analyze(path)
+    return time.perf_counter() - start
+
+
+def bar_cost(path, repeat):
+    """Time spent in the bar alone for one analyze() of `path`: creation, every chunk update and close."""
+    utils = STLUtils()
+    with utils.open_stl(path):
+        pass
+    total = utils.triangle_count if utils.is_binary_file else utils.file_size
+    step = READ_CHUNK_FACETS if utils.is_binary_file else ASCII_READ_BLOCK
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with utils.progress(total, step, desc="Analyzing triangles") as pbar:
+            for done in range(0, total, step):
+                pbar.update(min(step, total - done))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--facets', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--ascii-facets', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--budget-pct', type=float, default=1.0)
+    args = parser.parse_args()
+
+    terminal = FakeTerminal()
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for facets in args.facets:
+            path = os.path.join(tmp, f'binary_{facets}.stl')
+            write_binary_stl(path, random_triangles(facets))
+            files.append((f'binary {facets:,}', path))
+        if args.ascii_facets:
+            path = os.path.join(tmp, f'ascii_{args.ascii_facets}.stl')
+            write_ascii_stl(path, random_triangles(args.ascii_facets))
+            files.append((f'ascii {args.ascii_facets:,}', path))
+
+        print(f"{'file':>18} {'quiet ms':>10} {'bar ms':>10} {'delta':>8} {'bar only':>8} {'overhead':>9}")
+        stderr = sys.stderr
+        for label, path in files:
+            # Warm-up: page cache, lazy numpy and tqdm imports
+            timed_analyze(path, False)
+            sys.stderr = terminal
+            try:
+                timed_analyze(path, True)
+            finally:
+                sys.stderr = stderr
+            quiet, bar = [], []
+            for run in range(args.repeat):
+                # Alternate which variant goes first so warm-up effects cancel out
+                for show_progress in ((False, True) if run % 2 == 0 else (True, False)):
+                    if not show_progress:
+                        quiet.append(timed_analyze(path, False))
+                        continue
+                    sys.stderr = terminal
+                    try:
+                        bar.append(timed_analyze(path, True))
+                    finally:
+                        sys.stderr = stderr
+            # Best of N: noise only ever adds time, overhead is the gap between the floors
+            quiet_s, bar_s = min(quiet), min(bar)
+            sys.stderr = terminal
+            try:
+                isolated_s = bar_cost(path, args.repeat)
+            finally:
+                sys.stderr = stderr
+            delta = (bar_s - quiet_s) / quiet_s * 100
+            overhead = isolated_s / quiet_s * 100
+            worst = max(worst, overhead)
+            print(f"{label:>18} {quiet_s * 1000:>10.2f} {bar_s * 1000:>10.2f} {delta:>7.2f}% "
+                  f"{isolated_s * 1000:>8.3f} {overhead:>8.3f}%")
+
+    print(f"worst overhead: {worst:.2f}% (budget {args.budget_pct:.2f}%)")
+    sys.exit(0 if worst <= args.budget_pct else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+'''
+Per-stage timings of the STLUtils hot paths on synthetic fixtures.
+
+Stages: load (loadSTL), bounds (_calculate_bounding_box), volume
+(calculate_volume), area (calculate_surface_area) and analyze (the
+single-pass streaming analysis used by the CLI). Each stage reports the best
+of --repeat runs, facets/s, MB/s and its peak traced memory. MB/s is measured
+against the file size for load and analyze and against the in-memory
+triangle array (36 bytes per facet) for the other stages.
+
+Usage:
+  python -m benchmarks.bench_stages [--sizes 1K 100K 1M] [--shapes sphere torus scan]
+                                    [--formats binary ascii] [--output results.json]
+                                    [--compare baseline.json] [--threshold 10]
+
+With --compare, exits non-zero when any stage present in both runs got slower
+than the baseline by more than --threshold percent.
+'''
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import volume_calculator  # noqa: E402
+from volume_calculator import STLUtils  # noqa: E402
+from benchmarks.meshes import DEFAULT_FIXTURE_DIR, FORMATS, SHAPES, SIZES, fixture_path  # noqa: E402
+
+STAGES = ('load', 'bounds', 'volume', 'area', 'analyze')
+FILE_STAGES = ('load', 'analyze')
+
+
+def stage_runners(path):
+    """Zero-argument callables per stage; the in-memory stages share one loaded STLUtils."""
+    loaded = STLUtils(show_progress=False)
+    loaded.loadSTL(path)
+    return {
+        'load': lambda: STLUtils(show_progress=False).loadSTL(path),
+        'bounds': loaded._calculate_bounding_box,
+        'volume': loaded.calculate_volume,
+        'area': loaded.calculate_surface_area,
+        'analyze': lambda: STLUtils(show_progress=False).analyze(path),
+    }, loaded.triangle_count
+
+
+def peak_memory_mb(run):
+    """Peak memory traced while `run` executes (NumPy reports its buffers to tracemalloc)."""
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def bench_fixture(shape, facets, fmt, repeat, fixture_dir):
+    path = fixture_path(shape, facets, fmt, fixture_dir)
+    file_bytes = os.path.getsize(path)
+    runners, count = stage_runners(path)
+    stages = {}
+    for stage in STAGES:
+        run = runners[stage]
+        run() # warm-up: page cache, lazy imports
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        data_bytes = file_bytes if stage in FILE_STAGES else count * 36
+        stages[stage] = {
+            'seconds': best,
+            'facets_per_s': count / best,
+            'mb_per_s': data_bytes / best / 1e6,
+            'peak_mb': peak_memory_mb(run),
+        }
+    return {
+        'fixture': f'{shape}-{facets}-{fmt}',
+        'shape': shape,
+        'facets': count,
+        'format': fmt,
+        'file_bytes': file_bytes,
+        'stages': stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every stage against a baseline run; returns the regressions."""
+    previous = {entry['fixture']: entry['stages'] for entry in baseline['results']}
+    regressions = []
+    print(f"\nagainst {baseline['meta'].get('commit') or 'baseline'} (threshold {threshold:.1f}%):")
+    for entry in results:
+        for stage, timing in entry['stages'].items():
+            before = previous.get(entry['fixture'], {}).get(stage)
+            if before is None:
+                continue
+            change = (timing['seconds'] / before['seconds'] - 1.0) * 100
+            flag = 'REGRESSION' if change > threshold else ''
+            print(f"{entry['fixture']:>26} {stage:>8} {before['seconds'] * 1000:>10.2f} -> "
+                  f"{timing['seconds'] * 1000:>10.2f} ms {change:>+8.1f}% {flag}")
+            if flag:
+                regressions.append((entry['fixture'], stage, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=['1K', '100K', '1M'])
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fixture-dir', default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON results of an earlier run to compare against.')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed slowdown in percent (default: 10).')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'fixture':>26} {'stage':>8} {'ms':>10} {'Mfacets/s':>10} {'MB/s':>9} {'peak MB':>8}")
+    for fmt in args.formats:
+        for shape in args.shapes:
+            for size in args.sizes:
+                entry = bench_fixture(shape, SIZES[size], fmt, args.repeat, args.fixture_dir)
+                results.append(entry)
+                for stage, timing in entry['stages'].items():
+                    print(f"{entry['fixture']:>26} {stage:>8} {timing['seconds'] * 1000:>10.2f} "
+                          f"{timing['facets_per_s'] / 1e6:>10.2f} {timing['mb_per_s']:>9.1f} {timing['peak_mb']:>8.1f}")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'version': volume_calculator.__version__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.1f}%")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+'''
+Cold-start time of the CLI for a run that never draws a table or a progress bar.
+
+Usage: python benchmarks/bench_startup.py [--runs 20] [--budget-ms 100]
+
+Exits non-zero when the median exceeds the budget.
+'''
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'volume_calculator.py')
+COMMAND = [sys.executable, SCRIPT, '--list-materials', '--output-format', 'json']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    # Interpreter startup alone, to separate it from the tool's own import cost
+    baseline = []
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        baseline.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        subprocess.run(COMMAND, check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    median = statistics.median(timings)
+    print(f"command:          {' '.join(COMMAND[1:])}")
+    print(f"python -c pass:   median {statistics.median(baseline):7.1f} ms")
+    print(f"volume-calculator median {median:7.1f} ms, min {min(timings):7.1f} ms, max {max(timings):7.1f} ms")
+    print(f"budget:           {args.budget_ms:7.1f} ms -> {'OK' if median <= args.budget_ms else 'FAIL'}")
+    sys.exit(0 if median <= args.budget_ms else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+'''
+Speedup curve of `volume-calculator --workers N` on a synthetic binary STL.
+
+Usage: python benchmarks/bench_workers.py [--facets 20000000] [--max-workers 8]
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from volume_calculator import STLUtils, stl_facet_dtype  # noqa: E402
+
+
+def write_random_stl(path, facets, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as f:
+        f.write(b'bench_workers'.ljust(80, b' '))
+        f.write(np.uint32(facets).tobytes())
+        for start in range(0, facets, 1 << 20):
+            records = np.zeros(min(1 << 20, facets - start), dtype=stl_facet_dtype())
+            for field in ('v0', 'v1', 'v2'):
+                records[field] = rng.uniform(-100.0, 100.0, (len(records), 3))
+            records.tofile(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--facets', type=int, default=20_000_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.stl')
+        write_random_stl(path, args.facets)
+
+        baseline = None
+        reference = None
+        print(f"{'workers':>8} {'seconds':>10} {'Mfacets/s':>10} {'speedup':>8}")
+        workers = 1
+        while workers <= args.max_workers:
+            utils = STLUtils(workers=workers)
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = utils.analyze(path)
+                best = min(best, time.perf_counter() - start)
+            if reference is None:
+                reference = results
+            # Parallel partial sums must match the single-process result
+            assert np.isclose(results['volume_cm3'], reference['volume_cm3'], rtol=1e-9)
+            assert np.isclose(results['surface_area_cm2'], reference['surface_area_cm2'], rtol=1e-9)
+            baseline = baseline or best
+            print(f"{workers:>8} {best:>10.3f} {args.facets / best / 1e6:>10.2f} {baseline / best:>8.2f}")
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
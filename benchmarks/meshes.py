@@ -0,0 +1,119 @@
+'''
+Deterministic synthetic STL fixtures for the benchmarks.
+
+Every generator returns an (N, 3, 3) float32 triangle array of a closed,
+outward-oriented surface with approximately the requested number of facets,
+so the volume and area of each fixture are known up to tessellation error.
+'''
+
+import os
+import tempfile
+
+import numpy as np
+
+from volume_calculator import STL_HEADER_SIZE, stl_facet_dtype
+
+SHAPES = ('sphere', 'torus', 'scan')
+FORMATS = ('binary', 'ascii')
+SIZES = {'1K': 1_000, '100K': 100_000, '1M': 1_000_000, '10M': 10_000_000}
+DEFAULT_FIXTURE_DIR = os.path.join(tempfile.gettempdir(), 'volume_calculator_bench')
+WRITE_BLOCK = 1 << 18
+# Bump when a generator changes so cached fixture files are rebuilt
+FIXTURE_VERSION = 1
+
+
+def grid_size(facets, ratio):
+    """Rows and columns of a quad grid with 2 * rows * cols close to `facets` and cols ~ ratio * rows."""
+    rows = max(3, int(round(np.sqrt(facets / (2.0 * ratio)))))
+    cols = max(3, int(round(facets / (2.0 * rows))))
+    return rows, cols
+
+
+def quad_grid(points, wrap_rows):
+    """Triangulate an (rows, cols, 3) point grid that wraps around in columns (and in rows if wrap_rows)."""
+    rows, cols = points.shape[:2]
+    i, j = np.meshgrid(np.arange(rows if wrap_rows else rows - 1), np.arange(cols), indexing='ij')
+    i1, j1 = (i + 1) % rows, (j + 1) % cols
+    a, b, c, d = points[i, j], points[i, j1], points[i1, j], points[i1, j1]
+    return np.concatenate((np.stack((a, c, b), axis=-2).reshape(-1, 3, 3),
+                           np.stack((b, c, d), axis=-2).reshape(-1, 3, 3)))
+
+
+def sphere(facets, radius=50.0, noise=0.0, seed=0):
+    """UV sphere; with noise > 0 the radius is jittered per vertex like a raw 3D scan."""
+    rows, cols = grid_size(facets, 2.0)
+    theta = np.linspace(0.0, np.pi, rows + 1)[1:-1]
+    phi = np.linspace(0.0, 2.0 * np.pi, cols, endpoint=False)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    r = np.full(t.shape, radius)
+    if noise:
+        r += np.random.default_rng(seed).normal(0.0, noise, t.shape)
+    ring = np.stack((r * np.sin(t) * np.cos(p), r * np.sin(t) * np.sin(p), r * np.cos(t)), axis=-1)
+    body = quad_grid(ring, wrap_rows=False)
+    # Pole fans close the surface
+    top, bottom = np.array([0.0, 0.0, radius]), np.array([0.0, 0.0, -radius])
+    j, j1 = np.arange(cols), (np.arange(cols) + 1) % cols
+    first, last = ring[0], ring[-1]
+    caps = np.concatenate((
+        np.stack((np.broadcast_to(top, first.shape), first[j], first[j1]), axis=1),
+        np.stack((np.broadcast_to(bottom, last.shape), last[j1], last[j]), axis=1),
+    ))
+    return np.concatenate((body, caps)).astype(np.float32)
+
+
+def torus(facets, major=40.0, minor=15.0):
+    rows, cols = grid_size(facets, 3.0)
+    u = np.linspace(0.0, 2.0 * np.pi, cols, endpoint=False)
+    v = np.linspace(0.0, 2.0 * np.pi, rows, endpoint=False)
+    vv, uu = np.meshgrid(v, u, indexing='ij')
+    ring = major + minor * np.cos(vv)
+    points = np.stack((ring * np.cos(uu), ring * np.sin(uu), minor * np.sin(vv)), axis=-1)
+    # quad_grid winds the tube inwards; reverse the vertex order for outward normals
+    return quad_grid(points, wrap_rows=True)[:, ::-1].astype(np.float32)
+
+
+def scan(facets, seed=0):
+    """Noisy sphere standing in for an unprocessed 3D scan (irregular normals, no symmetry)."""
+    return sphere(facets, noise=0.25, seed=seed)
+
+
+GENERATORS = {'sphere': sphere, 'torus': torus, 'scan': scan}
+
+
+def write_binary_stl(path, triangles, header=b'volume_calculator benchmark'):
+    with open(path, 'wb') as f:
+        f.write(header.ljust(STL_HEADER_SIZE - 4, b' '))
+        f.write(np.uint32(len(triangles)).tobytes())
+        for start in range(0, len(triangles), WRITE_BLOCK):
+            block = triangles[start:start + WRITE_BLOCK]
+            records = np.zeros(len(block), dtype=stl_facet_dtype())
+            records['v0'], records['v1'], records['v2'] = block[:, 0], block[:, 1], block[:, 2]
+            records.tofile(f)
+
+
+ASCII_FACET = (' facet normal 0 0 0\n  outer loop\n'
+               '   vertex %.7e %.7e %.7e\n   vertex %.7e %.7e %.7e\n   vertex %.7e %.7e %.7e\n'
+               '  endloop\n endfacet\n')
+
+
+def write_ascii_stl(path, triangles, name='benchmark'):
+    with open(path, 'w') as f:
+        f.write(f'solid {name}\n')
+        for start in range(0, len(triangles), WRITE_BLOCK):
+            block = triangles[start:start + WRITE_BLOCK]
+            f.write((ASCII_FACET * len(block)) % tuple(block.reshape(-1).tolist()))
+        f.write(f'endsolid {name}\n')
+
+
+WRITERS = {'binary': write_binary_stl, 'ascii': write_ascii_stl}
+
+
+def fixture_path(shape, facets, fmt, directory=DEFAULT_FIXTURE_DIR):
+    """Path of a fixture, generating it on first use; files are reused across runs."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{shape}-{facets}-{fmt}-v{FIXTURE_VERSION}.stl')
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        WRITERS[fmt](partial, GENERATORS[shape](facets))
+        os.replace(partial, path)
+    return path
@@ -21,12 +21,18 @@ setup(
     install_requires=[
         'numpy>=1.19',
         'numpy-stl>=2.0',
-        'nibabel>=3.0',
-        'pydicom>=2.0',
-        'scikit-image>=0.19',
         'tqdm>=4.0',
         'rich>=10.0'  # Added dependency for table formatting
     ],
+
+    # Medical imaging stack, only needed for --filetype nii / dcm
+    extras_require={
+        'medical': [
+            'nibabel>=3.0',
+            'pydicom>=2.0',
+            'scikit-image>=0.19',
+        ],
+    },
     
     # This creates a command-line script that runs the `main` function
     entry_points={
@@ -48,5 +54,5 @@ setup(
         'Topic :: Multimedia :: Graphics :: 3D Modeling',
     ],
     
-    python_requires='>=3.6',
+    python_requires='>=3.9',
 )
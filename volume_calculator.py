@@ -6,89 +6,935 @@ Author: Mar Canet (mar.canet@gmail.com) - August 2012-2025
 Description: Calculate volume and mass of STL models (binary and ASCII), NIfTI, and DICOM files.
 '''
 
+__version__ = '1.0.2'
+
 import struct
 import sys
 import re
 import argparse
 import json
 import os
-try:
-    from tqdm import tqdm
-except ImportError:
-    print("tqdm is not installed. Please install it for table output: pip install tqdm")
-    sys.exit(1)
-    
-try:
-    from rich.console import Console
-    from rich.table import Table
-    import rich.box
-except ImportError:
-    print("Rich is not installed. Please install it for table output: pip install rich")
-    sys.exit(1)
-
-class materialsFor3DPrinting:
+import glob
+import time
+import hashlib
+import functools
+import contextlib
+import math
+import importlib
+import threading
+
+# Heavy dependencies are imported on first use so that quick invocations
+# (--list-materials, JSON output) do not pay for them at startup.
+class _LazyModule:
+    """Stand-in bound to a global alias that imports the real module when an attribute is first used.
+
+    The import is a regular one, so sys.modules only ever holds the real module and
+    other code importing it (or its submodules) is unaffected. The alias is then
+    rebound to the module, so later lookups bypass the stand-in.
+    """
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        try:
+            module = importlib.import_module(self._name)
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError(f"{self._name} is not installed. Please install it: pip install {self._name}") from None
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+np = _LazyModule('numpy', 'np')
+
+def load_rich():
+    """Import the rich table classes used for console output."""
+    try:
+        from rich.console import Console
+        from rich.table import Table
+        import rich.box
+    except ImportError:
+        print("Rich is not installed. Please install it for table output: pip install rich")
+        sys.exit(1)
+    return Console, Table, rich.box
+
+class _NoProgress:
+    """Stand-in for a disabled tqdm bar; avoids importing tqdm at all."""
+    def __init__(self, iterable=None):
+        self.iterable = iterable
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n=1):
+        pass
+
+def progress_bar(iterable=None, disable=False, **kwargs):
+    """Return a tqdm progress bar, importing tqdm only when the bar is actually shown.
+
+    Bars are drawn only on an interactive stderr, so redirected batch logs stay clean.
+    Callers update the bar once per chunk of facets or bytes, never per triangle.
+    """
+    if disable or not sys.stderr.isatty():
+        return _NoProgress(iterable)
+    try:
+        from tqdm import tqdm
+    except ImportError:
+        print("tqdm is not installed. Please install it for progress bars: pip install tqdm")
+        sys.exit(1)
+    return tqdm(iterable, **kwargs)
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, self.start, time.perf_counter())
+        return False
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_STAGE = _NoStage()
+
+class StageTimer:
+    """Wall time per named stage, counters (bytes read, facets) and Chrome trace events.
+
+    Disabled by default: stage() then returns a shared no-op context manager and
+    timed_iter() returns its argument, so instrumented code pays one attribute check.
+    Stage times are inclusive; a stage that calls another counts both. Trace events
+    are kept only while `tracing` is set, so a long-lived process reporting timings
+    does not accumulate them.
+    """
     def __init__(self):
-        # Materials are ordered from more to less common
-        self.materials_dict = {
-            1: {'name': 'PLA', 'mass': 1.25},
-            2: {'name': 'PETG', 'mass': 1.27},
-            3: {'name': 'ABS', 'mass': 1.02},
-            4: {'name': 'Resin', 'mass': 1.2},
-            5: {'name': 'TPU (Rubber-like)', 'mass': 1.2},
-            6: {'name': 'Polyamide_SLS', 'mass': 0.95},
-            7: {'name': 'Polyamide_MJF', 'mass': 1.01},
-            8: {'name': 'Plexiglass', 'mass': 1.18},
-            9: {'name': 'Alumide', 'mass': 1.36},
-            10: {'name': 'Carbon Steel', 'mass': 7.80},
-            11: {'name': 'Steel', 'mass': 7.86},
-            12: {'name': 'Aluminum', 'mass': 2.698},
-            13: {'name': 'Titanium', 'mass': 4.41},
-            14: {'name': 'Brass', 'mass': 8.6},
-            15: {'name': 'Bronze', 'mass': 9.0},
-            16: {'name': 'Copper', 'mass': 9.0},
-            17: {'name': 'Silver', 'mass': 10.26},
-            18: {'name': 'Gold_14K', 'mass': 13.6},
-            19: {'name': 'Gold_18K', 'mass': 15.6},
-            20: {'name': '3k CFRP', 'mass': 1.79},
-            21: {'name': 'Red Oak', 'mass': 5.70}
+        self.enabled = False
+        self.tracing = False
+        self.events = []
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _NO_STAGE
+
+    def add(self, name, start, end):
+        seconds, calls = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (seconds + end - start, calls + 1)
+        if not self.tracing:
+            return
+        self.events.append({
+            'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+            'pid': os.getpid(), 'tid': threading.get_native_id()
+        })
+
+    def count(self, name, amount):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timed_iter(self, iterable, name):
+        """Time every next() of `iterable` as stage `name`, e.g. reading the chunks a loop consumes."""
+        return self._timed_iter(iterable, name) if self.enabled else iterable
+
+    def _timed_iter(self, iterable, name):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, start, time.perf_counter())
+            yield item
+
+    def take_events(self):
+        events, self.events = self.events, []
+        return events
+
+    def report(self):
+        """The `timings` block of the JSON output."""
+        total = time.perf_counter() - self.started
+        report = {
+            "total_seconds": round(total, 6),
+            "stages": {name: {"seconds": round(seconds, 6), "calls": calls} for name, (seconds, calls) in self.stages.items()},
+        }
+        report.update(self.counters)
+        if 'bytes_read' in self.counters:
+            report["mb_per_s"] = round(self.counters['bytes_read'] / total / 1e6, 3)
+        if 'facets' in self.counters:
+            report["facets_per_s"] = round(self.counters['facets'] / total, 1)
+        report.update(peak_rss_mb())
+        return report
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished child processes (Unix only)."""
+    try:
+        import resource
+    except ImportError:
+        return {}
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6, 1),
+        "peak_rss_children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6, 1),
+    }
+
+STAGE_TIMER = StageTimer()
+
+def timed_stage(name):
+    """Decorator recording every call of a function as stage `name` of STAGE_TIMER."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not STAGE_TIMER.enabled:
+                return func(*args, **kwargs)
+            with STAGE_TIMER.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Binary STL layout: 80-byte header, uint32 facet count, then one 50-byte
+# record per facet (normal, three vertices, attribute byte count).
+STL_HEADER_SIZE = 84
+STL_FACET_SIZE = 50
+
+@functools.lru_cache(maxsize=None)
+def stl_facet_dtype():
+    return np.dtype([
+        ('normal', '<f4', (3,)),
+        ('v0', '<f4', (3,)),
+        ('v1', '<f4', (3,)),
+        ('v2', '<f4', (3,)),
+        ('attr', '<u2'),
+    ])
+# Facets read per block when loading binary files
+READ_CHUNK_FACETS = 1 << 18
+# Bytes of text parsed per block when loading ASCII files
+ASCII_READ_BLOCK = 16 << 20
+# Bytes per read() when a whole file or upload is read into memory
+READ_BLOCK_BYTES = 1 << 20
+# Captures the coordinates of each line starting with 'vertex' in an ASCII STL; anchoring on the
+# preceding newline keeps a solid name like 'vertex_cap' out and is as fast as a plain search
+ASCII_VERTEX_RE = re.compile(rb'\n[ \t]*vertex[ \t]+(.*)')
+
+def sniff_stl(head, file_size):
+    """True if an STL file with these first bytes and this size is binary.
+
+    A binary file holds exactly 84 + 50 * N bytes for the N facets announced in its
+    header. Many binary exporters also start the header with 'solid', so the size
+    check decides before the ASCII keyword is considered. Text never contains NUL
+    bytes, while a zero-padded header or a facet count below 2**24 does, which
+    catches binary files with a 'solid' header and trailing bytes after the facets.
+    """
+    head = bytes(head)
+    if len(head) >= STL_HEADER_SIZE:
+        count = struct.unpack_from("<I", head, 80)[0]
+        if file_size == STL_HEADER_SIZE + count * STL_FACET_SIZE:
+            return True
+    return not head.lstrip().startswith(b'solid') or b'\0' in head
+
+def facet_vertices(records):
+    """Return an (N, 3, 3) float32 view of the vertices of a facet record array."""
+    raw = records.view(np.uint8).reshape(len(records), STL_FACET_SIZE)
+    return raw[:, 12:48].view('<f4').reshape(len(records), 3, 3)
+
+# Per-block terms are reduced with np.sum, which sums contiguous float64 arrays
+# pairwise; block totals are then combined with CompensatedSum.
+def triple_products(tri):
+    """p1 . (p2 x p3) per triangle: six times the signed volume of the tetrahedron with the origin."""
+    return np.einsum('ij,ij->i', tri[:, 0], np.cross(tri[:, 1], tri[:, 2]))
+
+def signed_volume_sum(tri):
+    """Sum of signed tetrahedron volumes p1 . (p2 x p3) / 6 over a float64 triangle block (mm³)."""
+    return float(triple_products(tri).sum()) / 6.0
+
+def triangle_areas(tri):
+    """Area of every triangle of a float64 triangle block (mm²)."""
+    cross = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    return 0.5 * np.sqrt(np.einsum('ij,ij->i', cross, cross))
+
+def surface_area_sum(tri):
+    """Total area of a float64 triangle block (mm²)."""
+    return float(triangle_areas(tri).sum())
+
+def block_center(triangles):
+    """Centre of the bounding box of a triangle block, used as origin in high-accuracy mode."""
+    vertices = triangles.reshape(-1, 3)
+    return (vertices.min(axis=0).astype(np.float64) + vertices.max(axis=0)) / 2.0
+
+class CompensatedSum:
+    """Running float64 sum (scalar or element-wise array) with Neumaier (improved Kahan) error compensation."""
+    __slots__ = ('total', 'compensation')
+
+    def __init__(self, zero=0.0):
+        self.total = zero
+        self.compensation = zero
+
+    def add(self, value):
+        total = self.total + value
+        if np.ndim(total):
+            larger = np.abs(self.total) >= np.abs(value)
+            self.compensation = self.compensation + np.where(
+                larger, (self.total - total) + value, (value - total) + self.total
+            )
+        elif abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    def merge(self, other):
+        self.add(other.total)
+        self.add(other.compensation)
+
+    def value(self):
+        return self.total + self.compensation
+
+# Accuracy modes: 'standard' sums coordinates as stored; 'high' additionally
+# translates vertices to a local origin (the centre of the first block) before
+# forming the volume products, which removes most cancellation for meshes far
+# from the coordinate origin. Volumes of closed meshes are unaffected by the shift.
+ACCURACY_MODES = ('standard', 'high')
+
+class MeshStats:
+    """Running volume, area, bounds and triangle count over a stream of triangle blocks.
+
+    With mass_properties=True it also accumulates the first and second volume moments
+    (sums over the signed tetrahedra formed with the origin), from which the centroid and
+    the inertia tensor follow. Moments are always taken about a local origin: shifted to
+    the centroid with the parallel axis theorem, moments about a distant world origin
+    would cancel catastrophically.
+    """
+    def __init__(self, recenter=False, origin=None, mass_properties=False):
+        self.triangle_count = 0
+        self.volume_sum = CompensatedSum() # mm³
+        self.area_sum = CompensatedSum() # mm²
+        self.lower = np.full(3, np.inf)
+        self.upper = np.full(3, -np.inf)
+        self.recenter = recenter or origin is not None or mass_properties
+        self.origin = origin
+        self.mass_properties = mass_properties
+        if mass_properties:
+            self.first_moment_sum = CompensatedSum(np.zeros(3)) # mm⁴, about the origin
+            self.second_moment_sum = CompensatedSum(np.zeros((3, 3))) # mm⁵, about the origin
+
+    @property
+    def signed_volume(self):
+        return self.volume_sum.value()
+
+    @property
+    def area(self):
+        return self.area_sum.value()
+
+    def update(self, triangles):
+        if len(triangles) == 0:
+            return
+        vertices = triangles.reshape(-1, 3)
+        self.lower = np.minimum(self.lower, vertices.min(axis=0))
+        self.upper = np.maximum(self.upper, vertices.max(axis=0))
+        if self.recenter:
+            if self.origin is None:
+                self.origin = block_center(triangles)
+            # Conversion and shift in one pass
+            tri = np.subtract(triangles, self.origin, dtype=np.float64)
+        else:
+            tri = np.asarray(triangles, dtype=np.float64)
+        if self.mass_properties:
+            det = triple_products(tri)
+            self.volume_sum.add(float(det.sum()) / 6.0)
+            # Tetrahedron (0, a, b, c): first moment det (a + b + c) / 24,
+            # second moment det (aa' + bb' + cc' + ss') / 120 with s = a + b + c
+            corners = np.concatenate((tri, tri.sum(axis=1, keepdims=True)), axis=1)
+            self.first_moment_sum.add(det @ corners[:, 3] / 24.0)
+            # Flattened to one (3, 4n) x (4n, 3) product so BLAS does the reduction
+            weighted = (corners * det[:, None, None]).reshape(-1, 3)
+            self.second_moment_sum.add(corners.reshape(-1, 3).T @ weighted / 120.0)
+        else:
+            self.volume_sum.add(signed_volume_sum(tri))
+        self.area_sum.add(surface_area_sum(tri))
+        self.triangle_count += len(triangles)
+
+    def merge(self, other):
+        """Fold the totals of another accumulator (e.g. from a worker process) into this one."""
+        self.triangle_count += other.triangle_count
+        self.volume_sum.merge(other.volume_sum)
+        self.area_sum.merge(other.area_sum)
+        if self.mass_properties:
+            self.first_moment_sum.merge(other.first_moment_sum)
+            self.second_moment_sum.merge(other.second_moment_sum)
+        self.lower = np.minimum(self.lower, other.lower)
+        self.upper = np.maximum(self.upper, other.upper)
+
+    def bounding_box_cm(self):
+        if self.triangle_count == 0:
+            return {'width': 0, 'depth': 0, 'height': 0}
+        width_cm, depth_cm, height_cm = ((self.upper - self.lower) / 10.0).tolist()
+        return {'width': width_cm, 'depth': depth_cm, 'height': height_cm}
+
+    def results(self):
+        results = {
+            'triangle_count': self.triangle_count,
+            'bounding_box_cm': self.bounding_box_cm(),
+            'surface_area_cm2': self.area / 100,
+            'volume_cm3': self.signed_volume / 1000,
         }
+        if self.mass_properties:
+            results.update(self.moments_cm())
+        return results
+
+    def moments_cm(self):
+        """Centroid (cm) and second moment of volume about the centroid (cm⁵)."""
+        volume = self.signed_volume
+        if volume == 0:
+            return {'centroid_cm': [0.0, 0.0, 0.0], 'second_moment_cm5': np.zeros((3, 3)).tolist()}
+        offset = self.first_moment_sum.value() / volume
+        origin = np.zeros(3) if self.origin is None else self.origin
+        # Parallel axis theorem moves the second moment from the origin to the centroid;
+        # rounding can leave the sum slightly asymmetric, the tensor itself is symmetric
+        second_moment = self.second_moment_sum.value()
+        second_moment = (second_moment + second_moment.T) / 2.0 - volume * np.outer(offset, offset)
+        return {
+            'centroid_cm': ((origin + offset) / 10.0).tolist(),
+            'second_moment_cm5': (second_moment / 1e5).tolist(),
+        }
+
+def inertia_tensor(second_moment_cm5, density_g_cm3):
+    """Inertia tensor (g·cm²) of a solid of uniform density from its second moment of volume about the centroid."""
+    second_moment = np.asarray(second_moment_cm5)
+    return density_g_cm3 * (np.trace(second_moment) * np.eye(3) - second_moment)
+
+# Vertices closer than this (per axis, after rounding to the grid) are welded into one
+WELD_TOLERANCE_MM = 1e-4
+# Odd 64-bit multipliers for the spatial hash of quantized coordinates
+WELD_HASH_PRIMES = (-7046029254386353131, -4658895280553007687, 2685821657736338717)
+
+def quantize_vertices(vertices, tolerance):
+    """Round (M, 3) vertex coordinates to integer multiples of the weld tolerance."""
+    return np.rint(np.asarray(vertices, dtype=np.float64) / tolerance).astype(np.int64)
+
+def group_keys(keys):
+    """Label equal int64 keys: returns (inverse, representative) like np.unique, but with an unstable sort."""
+    order = np.argsort(keys)
+    ordered = keys[order]
+    is_first = np.empty(len(keys), dtype=bool)
+    is_first[:1] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=is_first[1:])
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[order] = np.cumsum(is_first) - 1
+    return inverse, order[is_first]
+
+def weld_vertices(triangles, tolerance=WELD_TOLERANCE_MM, chunk_size=READ_CHUNK_FACETS):
+    """Merge coincident vertices of an (N, 3, 3) triangle array.
+
+    Quantized coordinates are hashed to one int64 per vertex and equal hashes are
+    grouped with a sort. Hash collisions are detected by comparing every vertex
+    with the representative of its group, and fall back to an exact row-wise
+    unique. Returns (faces, vertex_count) where faces is an (N, 3) int64 array of
+    welded vertex ids.
+    """
+    count = len(triangles)
+    vertices = triangles.reshape(-1, 3)
+    keys = np.empty(3 * count, dtype=np.int64)
+    x_prime, y_prime, z_prime = WELD_HASH_PRIMES
+    for start in range(0, 3 * count, 3 * chunk_size):
+        quantized = quantize_vertices(vertices[start:start + 3 * chunk_size], tolerance)
+        # Polynomial hash modulo 2**64 (int64 multiplication wraps around)
+        keys[start:start + len(quantized)] = ((quantized[:, 0] * x_prime + quantized[:, 1]) * y_prime + quantized[:, 2]) * z_prime
+    inverse, first = group_keys(keys)
+    del keys
+    representatives = quantize_vertices(vertices[first], tolerance)
+    for start in range(0, 3 * count, 3 * chunk_size):
+        stop = start + 3 * chunk_size
+        if not np.array_equal(quantize_vertices(vertices[start:stop], tolerance), representatives[inverse[start:stop]]):
+            _, inverse = np.unique(quantize_vertices(vertices, tolerance), axis=0, return_inverse=True)
+            return inverse.reshape(count, 3), int(inverse.max()) + 1
+    return inverse.reshape(count, 3), len(first)
+
+def union_find_labels(heads, tails, vertex_count):
+    """Connected-component root of every vertex of the graph with edges (heads[i], tails[i]).
+
+    Vectorized union-find: each round hooks both ends of every edge onto the
+    smaller of their labels, then pointer jumping flattens the label trees.
+    """
+    labels = np.arange(vertex_count)
+    while True:
+        lowest = np.minimum(labels[heads], labels[tails])
+        np.minimum.at(labels, heads, lowest)
+        np.minimum.at(labels, tails, lowest)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels[heads], labels[tails]):
+            return labels
+
+def label_components(faces, vertex_count):
+    """Label the connected bodies of welded faces; returns (face_labels, body_count).
+
+    Bodies are numbered in the order of their first face in the file. Uses
+    scipy.sparse.csgraph when SciPy is installed and a NumPy union-find otherwise.
+    """
+    heads = faces[:, :2].reshape(-1)
+    tails = faces[:, 1:].reshape(-1)
+    try:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError:
+        vertex_labels = union_find_labels(heads, tails, vertex_count)
+    else:
+        graph = coo_matrix((np.ones(len(heads), dtype=np.int8), (heads, tails)), shape=(vertex_count, vertex_count))
+        _, vertex_labels = connected_components(graph, directed=False)
+    inverse, first_face = group_keys(vertex_labels[faces[:, 0]])
+    rank = np.empty(len(first_face), dtype=np.int64)
+    rank[np.argsort(first_face)] = np.arange(len(first_face))
+    return rank[inverse], len(first_face)
+
+def component_stats(triangles, face_labels, body_count, chunk_size=READ_CHUNK_FACETS):
+    """Per-body triangle count, volume (mm³), area (mm²) and bounds (mm) of labelled triangles."""
+    # Closed bodies have the same volume about any origin; the mesh centre keeps the products small
+    origin = block_center(triangles) if len(triangles) else np.zeros(3)
+    volume = np.zeros(body_count)
+    area = np.zeros(body_count)
+    lower = np.full((body_count, 3), np.inf)
+    upper = np.full((body_count, 3), -np.inf)
+    for start in range(0, len(triangles), chunk_size):
+        tri = np.subtract(triangles[start:start + chunk_size], origin, dtype=np.float64)
+        labels = face_labels[start:start + chunk_size]
+        volume += np.bincount(labels, triple_products(tri), minlength=body_count) / 6.0
+        area += np.bincount(labels, triangle_areas(tri), minlength=body_count)
+        np.minimum.at(lower, labels, np.minimum(np.minimum(tri[:, 0], tri[:, 1]), tri[:, 2]))
+        np.maximum.at(upper, labels, np.maximum(np.maximum(tri[:, 0], tri[:, 1]), tri[:, 2]))
+    return {
+        'triangle_count': np.bincount(face_labels, minlength=body_count),
+        'volume': volume,
+        'area': area,
+        'lower': lower + origin,
+        'upper': upper + origin,
+    }
+
+def edge_report(faces, vertex_count):
+    """Count boundary, non-manifold and inconsistently wound edges of welded faces.
+
+    Every directed edge (a, b) is encoded as one int64: the undirected pair
+    min(a, b) * vertex_count + max(a, b), shifted left by one bit that records the
+    direction. A single sort then groups the faces around each edge.
+    """
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    faces = faces[~degenerate]
+    heads = faces.reshape(-1)
+    tails = faces[:, [1, 2, 0]].reshape(-1)
+    codes = np.minimum(heads, tails) * vertex_count + np.maximum(heads, tails)
+    codes <<= 1
+    codes |= heads > tails
+    codes.sort()
+    pairs = codes >> 1
+    starts = np.flatnonzero(np.concatenate(([True], pairs[1:] != pairs[:-1]))) if len(codes) else np.empty(0, dtype=np.int64)
+    face_counts = np.diff(np.append(starts, len(codes)))
+    reversed_counts = np.add.reduceat(codes & 1, starts) if len(codes) else np.empty(0, dtype=np.int64)
+    # Two faces sharing an edge must traverse it in opposite directions
+    two_faces = face_counts == 2
+    return {
+        'edge_count': len(starts),
+        'boundary_edges': int(np.count_nonzero(face_counts == 1)),
+        'non_manifold_edges': int(np.count_nonzero(face_counts > 2)),
+        'inconsistent_winding_edges': int(np.count_nonzero(two_faces & (reversed_counts != 1))),
+        'degenerate_faces': int(np.count_nonzero(degenerate)),
+    }
+
+def analyze_binary_range(infilename, start, stop, chunk_size=READ_CHUNK_FACETS, origin=None, mass_properties=False):
+    """Accumulate MeshStats for facets [start, stop) of a binary STL; runs in worker processes."""
+    records = np.memmap(infilename, dtype=stl_facet_dtype(), mode='r', offset=STL_HEADER_SIZE, shape=(stop,))
+    stats = MeshStats(origin=origin, mass_properties=mass_properties)
+    for first in range(start, stop, chunk_size):
+        stats.update(facet_vertices(records[first:min(first + chunk_size, stop)]))
+    return stats
+
+class MaterialCatalog:
+    """Validated material list stored column-wise: ids, names and densities as parallel lists.
+
+    `ids` and `densities` are the same columns as NumPy arrays for vectorized mass
+    tables; they are built on first use so listing or resolving materials never
+    imports NumPy.
+
+    Materials are looked up by id or (case-insensitive) name. Catalogs load from
+    JSON, CSV or TOML files, or from a directory of them, and every entry needs a
+    name and a density in g/cm³ ('density', or 'mass' as in the built-in table).
+    Entries without an id are numbered after the highest explicit id.
+    """
+    FILE_TYPES = ('.json', '.csv', '.toml')
+
+    def __init__(self, entries, source='built-in'):
+        self.source = source
+        for position, entry in enumerate(entries, start=1):
+            if not isinstance(entry, dict):
+                raise ValueError(f"{source}: material #{position} must be an object")
+        explicit = [int(entry['id']) for entry in entries if entry.get('id') not in (None, '')]
+        next_id = max(explicit, default=0) + 1
+        ids, names, densities = [], [], []
+        for position, entry in enumerate(entries, start=1):
+            name = str(entry.get('name') or '').strip()
+            density = entry.get('density', entry.get('density_g_cm3', entry.get('mass')))
+            if not name or density in (None, ''):
+                raise ValueError(f"{source}: material #{position} needs a name and a density")
+            if entry.get('id') in (None, ''):
+                ids.append(next_id)
+                next_id += 1
+            else:
+                ids.append(int(entry['id']))
+            names.append(name)
+            densities.append(float(density))
+        if not names:
+            raise ValueError(f"{source}: no materials")
+        self.id_list = ids
+        self.names = names
+        self.density_list = densities
+        self._arrays = None
+        if not all(math.isfinite(density) and density > 0 for density in densities):
+            raise ValueError(f"{source}: densities must be positive numbers")
+        self.index_by_id = {material_id: index for index, material_id in enumerate(ids)}
+        self.index_by_name = {name.casefold(): index for index, name in enumerate(names)}
+        if len(self.index_by_id) != len(ids):
+            raise ValueError(f"{source}: duplicate material ids")
+        if len(self.index_by_name) != len(names):
+            raise ValueError(f"{source}: duplicate material names")
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def ids(self):
+        return self._vectors()[0]
+
+    @property
+    def densities(self):
+        return self._vectors()[1]
+
+    def _vectors(self):
+        if self._arrays is None:
+            self._arrays = (np.array(self.id_list, dtype=np.int64), np.array(self.density_list, dtype=np.float64))
+        return self._arrays
+
+    @classmethod
+    def from_path(cls, path):
+        """Load a catalog file, or every catalog file in a directory (in name order)."""
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(cls.FILE_TYPES))
+            if not files:
+                raise ValueError(f"{path}: no {', '.join(cls.FILE_TYPES)} material files")
+        else:
+            files = [path]
+        entries = []
+        for filename in files:
+            file_entries = read_material_entries(filename)
+            if not isinstance(file_entries, list):
+                raise ValueError(f"{filename}: expected a list of materials")
+            entries.extend(file_entries)
+        return cls(entries, source=path)
+
+    def index_of(self, key):
+        """Position of a material given its id (int or digit string) or its name."""
+        if isinstance(key, str) and not key.strip().isdigit():
+            index = self.index_by_name.get(key.strip().casefold())
+        else:
+            index = self.index_by_id.get(int(key))
+        if index is None:
+            raise KeyError(f"unknown material {key!r}; see --list-materials")
+        return index
+
+    def resolve(self, key):
+        """Material id for an id or name."""
+        return self.id_list[self.index_of(key)]
 
     def get_material_info(self, material_id):
-        return self.materials_dict.get(material_id)
+        try:
+            index = self.index_of(material_id)
+        except KeyError:
+            return None
+        return {'name': self.names[index], 'mass': self.density_list[index]}
+
+    @property
+    def materials_dict(self):
+        return {material_id: {'name': name, 'mass': density}
+                for material_id, name, density in zip(self.id_list, self.names, self.density_list)}
 
     def list_materials(self, output_format='table'):
         if output_format == 'json':
             print(json.dumps(self.materials_dict, indent=4))
         else:
+            Console, Table, _ = load_rich()
             console = Console()
-            table = Table(title="Available 3D Printing Materials", show_header=True, header_style="bold magenta")
+            title = "Available 3D Printing Materials" if self.source == 'built-in' else f"Materials: {self.source}"
+            table = Table(title=title, show_header=True, header_style="bold magenta")
             table.add_column("ID", style="dim", width=6)
             table.add_column("Name")
             table.add_column("Density (g/cm³)", justify="right")
 
-            for key, value in self.materials_dict.items():
-                table.add_row(str(key), value['name'], f"{value['mass']:.3f}")
+            for material_id, name, density in zip(self.id_list, self.names, self.density_list):
+                table.add_row(str(material_id), name, f"{density:.3f}")
             console.print(table)
 
-class STLUtils:
+def read_material_entries(filename):
+    """Raw material entries (dicts) of one JSON, CSV or TOML catalog file."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        import csv
+        with open(filename, newline='', encoding='utf-8') as f:
+            return [{key.strip().lower(): value for key, value in row.items() if key} for row in csv.DictReader(f)]
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ModuleNotFoundError("TOML material files need Python 3.11+ or tomli: pip install tomli")
+        with open(filename, 'rb') as f:
+            data = tomllib.load(f)
+        return data.get('material', data.get('materials', []))
+    with open(filename, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('materials', data)
+    if isinstance(data, dict):
+        # Same layout as `--list-materials --output-format json`: {"id": {"name": ..., "mass": ...}}
+        data = [dict(entry, id=material_id) if isinstance(entry, dict) else entry for material_id, entry in data.items()]
+    return data
+
+class materialsFor3DPrinting(MaterialCatalog):
+    """The built-in catalog."""
+    # Materials are ordered from more to less common
+    BUILTIN = [
+        (1, 'PLA', 1.25),
+        (2, 'PETG', 1.27),
+        (3, 'ABS', 1.02),
+        (4, 'Resin', 1.2),
+        (5, 'TPU (Rubber-like)', 1.2),
+        (6, 'Polyamide_SLS', 0.95),
+        (7, 'Polyamide_MJF', 1.01),
+        (8, 'Plexiglass', 1.18),
+        (9, 'Alumide', 1.36),
+        (10, 'Carbon Steel', 7.80),
+        (11, 'Steel', 7.86),
+        (12, 'Aluminum', 2.698),
+        (13, 'Titanium', 4.41),
+        (14, 'Brass', 8.6),
+        (15, 'Bronze', 9.0),
+        (16, 'Copper', 9.0),
+        (17, 'Silver', 10.26),
+        (18, 'Gold_14K', 13.6),
+        (19, 'Gold_18K', 15.6),
+        (20, '3k CFRP', 1.79),
+        (21, 'Red Oak', 5.70)
+    ]
+
     def __init__(self):
+        super().__init__([{'id': material_id, 'name': name, 'mass': density} for material_id, name, density in self.BUILTIN])
+
+@functools.lru_cache(maxsize=8)
+def _load_catalog(path, mtime, size):
+    return MaterialCatalog.from_path(path) if path else materialsFor3DPrinting()
+
+def load_material_catalog(path=None):
+    """Built-in catalog, or the one at `path`; parsed and validated once per process while the file is unchanged."""
+    if not path:
+        return _load_catalog(None, None, None)
+    stat = os.stat(path)
+    return _load_catalog(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+class ResultCache:
+    """Persistent SQLite cache of analysis results keyed by file content hash, tool version and SCHEMA."""
+    # Bump with every change that alters computed results, so entries cached by an older build are not served
+    SCHEMA = 4
+    DB_NAME = 'volume_calculator_cache.sqlite3'
+    HASH_BLOCK = 1 << 20
+
+    def __init__(self, cache_dir, max_entries=10000):
+        import sqlite3
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, self.DB_NAME)
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(self.path, timeout=30)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.db.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+
+    @timed_stage('cache_hash')
+    def file_key(self, filename, data=None, f=None):
+        """Content hash of a file; `data` is its content if already read, `f` an open handle to reuse in place."""
+        digest = hashlib.blake2b(digest_size=20)
+        if data is not None:
+            digest.update(data)
+        elif f is not None:
+            position = f.tell()
+            f.seek(0)
+            self._hash_stream(f, digest)
+            f.seek(position)
+        else:
+            with open(filename, 'rb') as f:
+                self._hash_stream(f, digest)
+        return f"{digest.hexdigest()}:{__version__}:{self.SCHEMA}"
+
+    def _hash_stream(self, f, digest):
+        for block in iter(lambda: f.read(self.HASH_BLOCK), b''):
+            digest.update(block)
+
+    def _bump(self, name, amount=1):
+        self.db.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get(self, key, usable=None):
+        """Cached results for `key`, or None; an entry failing the `usable` predicate counts as a miss."""
+        with self.db:
+            row = self.db.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+            results = json.loads(row[0]) if row is not None else None
+            if results is None or (usable is not None and not usable(results)):
+                self._bump('misses')
+                return None
+            self.db.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._bump('hits')
+        return results
+
+    def put(self, key, results):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, json.dumps(results), time.time())
+            )
+            # Evict least recently used entries beyond the size limit
+            evicted = self.db.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            ).rowcount
+            if evicted:
+                self._bump('evictions', evicted)
+
+    def stats(self):
+        counters = dict(self.db.execute("SELECT name, value FROM counters"))
+        return {
+            "path": self.path,
+            "entries": self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0],
+            "max_entries": self.max_entries,
+            "size_kb": f"{os.path.getsize(self.path) / 1024:.2f}",
+            "hits": counters['hits'],
+            "misses": counters['misses'],
+            "evictions": counters['evictions']
+        }
+
+class STLUtils:
+    def __init__(self, use_mmap=False, workers=1, show_progress=True, cache=None, accuracy='standard',
+                 mass_properties=False):
+        if accuracy not in ACCURACY_MODES:
+            raise ValueError(f"unknown accuracy mode {accuracy!r}")
+        self.accuracy = accuracy
+        self.mass_properties = mass_properties
+        self.use_mmap = use_mmap
+        self.workers = workers
+        self.show_progress = show_progress
+        self.cache = cache
         self.f = None
         self.is_binary_file = None
-        self.triangles = []
+        self.triangles = np.empty((0, 3, 3), dtype=np.float32)
         self.triangle_count = 0
         self.file_size = 0
         self.bounding_box_cm = None
+        self.welded = None
+        self.counted_input = None
 
-    def is_binary(self, file):
-        with open(file, 'rb') as f:
-            header = f.read(80).decode(errors='replace')
-            return not header.startswith('solid')
+    @timed_stage('detect')
+    def open_stl(self, infilename, data=None):
+        """Open an STL file once (or wrap its prefetched content) and sniff the format from its first bytes.
 
-    def read_ascii_triangle(self, lines, index):
-        p1 = list(map(float, re.findall(r"[-+]?\d*\.\d+|\d+", lines[index + 1])))
-        p2 = list(map(float, re.findall(r"[-+]?\d*\.\d+|\d+", lines[index + 2])))
-        p3 = list(map(float, re.findall(r"[-+]?\d*\.\d+|\d+", lines[index + 3])))
-        return (p1, p2, p3)
+        Sets file_size, is_binary_file and, for binary files, triangle_count. The
+        returned file is positioned at the first facet of a binary file or at the
+        start of an ASCII file, ready for the readers below. Prefetched content is
+        never copied: the context then yields None and the readers take `data` instead.
+        """
+        if data is not None:
+            f = contextlib.nullcontext()
+            self.file_size = len(data)
+            head = bytes(data[:STL_HEADER_SIZE])
+        else:
+            f = open(infilename, 'rb')
+        try:
+            if data is None:
+                self.file_size = os.fstat(f.fileno()).st_size
+                head = f.read(STL_HEADER_SIZE)
+            self.is_binary_file = sniff_stl(head, self.file_size)
+            if not self.is_binary_file:
+                if data is None:
+                    f.seek(0)
+            elif len(head) < STL_HEADER_SIZE:
+                raise ValueError(f"file is too short for a binary STL header ({len(head)} bytes)")
+            else:
+                self.triangle_count = struct.unpack_from("<I", head, 80)[0]
+        except BaseException:
+            if data is None:
+                f.close()
+            raise
+        return f
+
+    def iter_ascii_chunks(self, f, block_size=ASCII_READ_BLOCK, on_bytes=None, data=None):
+        """Yield the triangles of an open ASCII STL file (or of its prefetched `data`) in blocks, parsing each text block in bulk."""
+        view = memoryview(data) if data is not None else None
+
+        def read_block(start):
+            # Slices of prefetched content are views; only the text of one block is ever copied
+            return view[start:start + block_size] if view is not None else f.read(block_size)
+
+        # Every block starts with the newline ending the previous line, which anchors ASCII_VERTEX_RE
+        tail = b'\n'
+        pending = np.empty(0)
+        position = 0
+        while True:
+            block = read_block(position)
+            position += len(block)
+            if block:
+                text = tail + block
+                if b'\0' in text:
+                    raise ValueError("file starts with 'solid' but contains binary data; not a valid ASCII or binary STL")
+                cut = max(text.rfind(b'\n'), 0)
+                text, tail = text[:cut], text[cut:]
+            else:
+                text, tail = tail, b''
+            # One regex pass per block; float conversion (incl. exponents) happens in C
+            matches = ASCII_VERTEX_RE.findall(text)
+            coords = np.fromstring(b' '.join(matches), sep=' ') if matches else np.empty(0)
+            if len(coords) != 3 * len(matches):
+                raise ValueError("malformed vertex line")
+            coords = np.concatenate((pending, coords))
+            usable = len(coords) - len(coords) % 9
+            pending = coords[usable:]
+            if usable:
+                yield coords[:usable].reshape(-1, 3, 3)
+            if on_bytes is not None:
+                on_bytes(len(block))
+            if not block:
+                break
+        if len(pending):
+            raise ValueError("incomplete facet at end of file")
 
     def signedVolumeOfTriangle(self, p1, p2, p3):
         v321 = p3[0] * p2[1] * p1[2]
@@ -99,110 +945,1388 @@ class STLUtils:
         v123 = p1[0] * p2[1] * p3[2]
         return (1.0 / 6.0) * (-v321 + v231 + v312 - v132 - v213 + v123)
 
-    def unpack(self, sig, l):
-        s = self.f.read(l)
-        return struct.unpack(sig, s)
-
-    def read_triangle_binary(self):
-        self.unpack("<3f", 12) # Normal
-        p1 = self.unpack("<3f", 12)
-        p2 = self.unpack("<3f", 12)
-        p3 = self.unpack("<3f", 12)
-        self.unpack("<h", 2) # Attribute byte count
-        return (p1, p2, p3)
-
-    def loadSTL(self, infilename):
-        self.file_size = os.path.getsize(infilename)
-        self.is_binary_file = self.is_binary(infilename)
-        self.triangles = []
-        try:
+    def progress(self, total, step, **kwargs):
+        """Progress bar over `total` units advanced every `step`; skipped when it would only jump from 0 to done."""
+        return progress_bar(total=total, disable=not self.show_progress or total <= step, **kwargs)
+
+    def read_binary_facets(self, count):
+        # Check the header count against the file before allocating for it
+        if self.file_size < STL_HEADER_SIZE + count * STL_FACET_SIZE:
+            raise ValueError(f"file is truncated, expected {count} triangles")
+        records = np.empty(count, dtype=stl_facet_dtype())
+        buffer = memoryview(records.view(np.uint8))
+        step = READ_CHUNK_FACETS * STL_FACET_SIZE
+        with self.progress(count, READ_CHUNK_FACETS, desc="Reading triangles") as pbar:
+            for start in range(0, len(buffer), step):
+                chunk = buffer[start:start + step]
+                if self.f.readinto(chunk) != len(chunk):
+                    raise ValueError(f"file is truncated, expected {count} triangles")
+                pbar.update(len(chunk) // STL_FACET_SIZE)
+        return records
+
+    def map_binary_facets(self, source, count):
+        # Zero-copy: facets are paged in from the OS cache as they are reduced; source is a path or open file
+        if self.file_size < STL_HEADER_SIZE + count * STL_FACET_SIZE:
+            raise ValueError(f"file is truncated, expected {count} triangles")
+        return np.memmap(source, dtype=stl_facet_dtype(), mode='r', offset=STL_HEADER_SIZE, shape=(count,))
+
+    def buffer_facets(self, data, count):
+        # Zero-copy view of the facet records of a binary STL already read into memory
+        if len(data) < STL_HEADER_SIZE + count * STL_FACET_SIZE:
+            raise ValueError(f"file is truncated, expected {count} triangles")
+        return np.frombuffer(data, dtype=stl_facet_dtype(), count=count, offset=STL_HEADER_SIZE)
+
+    def iter_triangle_chunks(self, chunk_size=READ_CHUNK_FACETS):
+        """Yield the loaded triangles as float64 blocks of at most chunk_size facets."""
+        for start in range(0, len(self.triangles), chunk_size):
+            yield np.asarray(self.triangles[start:start + chunk_size], dtype=np.float64)
+
+    def iter_file_chunks(self, f, chunk_size=READ_CHUNK_FACETS, data=None):
+        """Yield the triangles of a binary STL file opened by open_stl in blocks, without loading the whole file."""
+        if data is not None or (self.use_mmap and self.triangle_count > 0):
+            if data is not None:
+                records = self.buffer_facets(data, self.triangle_count)
+            else:
+                records = self.map_binary_facets(f, self.triangle_count)
+            for start in range(0, self.triangle_count, chunk_size):
+                yield facet_vertices(records[start:start + chunk_size])
+            return
+        for start in range(0, self.triangle_count, chunk_size):
+            records = np.fromfile(f, dtype=stl_facet_dtype(), count=min(chunk_size, self.triangle_count - start))
+            if len(records) == 0:
+                raise ValueError(f"file is truncated, expected {self.triangle_count} triangles")
+            yield facet_vertices(records)
+
+    @timed_stage('compute')
+    def analyze_parallel(self, infilename, chunk_size=READ_CHUNK_FACETS, f=None):
+        """Split the facet range of a binary STL across worker processes and merge their partial sums."""
+        if self.file_size < STL_HEADER_SIZE + self.triangle_count * STL_FACET_SIZE:
+            raise ValueError(f"file is truncated, expected {self.triangle_count} triangles")
+        # A few slices per worker keeps the pool busy when some finish early
+        bounds = np.linspace(0, self.triangle_count, self.workers * 4 + 1).astype(np.int64).tolist()
+        origin = None
+        if (self.accuracy == 'high' or self.mass_properties) and self.triangle_count > 0:
+            # Every worker must use the same origin for the partial sums to add up
+            records = self.map_binary_facets(infilename if f is None else f, self.triangle_count)
+            origin = block_center(facet_vertices(records[:chunk_size]))
+        stats = MeshStats(origin=origin, mass_properties=self.mass_properties)
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(analyze_binary_range, infilename, lo, hi, chunk_size, origin, self.mass_properties)
+                       for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+            with self.progress(self.triangle_count, chunk_size, desc="Analyzing triangles") as pbar:
+                # Merge in facet order so results do not depend on scheduling
+                for future in futures:
+                    partial = future.result()
+                    stats.merge(partial)
+                    pbar.update(partial.triangle_count)
+        return stats
+
+    def analyze(self, infilename, chunk_size=READ_CHUNK_FACETS, data=None):
+        """Compute triangle count, bounding box, surface area and volume in a single streaming pass.
+
+        `data` is the file content when it has already been read (batch prefetch); the file is not opened then.
+        """
+        with self.open_stl(infilename, data) as f:
+            if self.cache is not None:
+                key = f"{self.cache.file_key(infilename, data, f)}:{self.accuracy}"
+                # An entry cached without mass properties cannot serve a run that needs them
+                results = self.cache.get(key, usable=lambda cached: not self.mass_properties or 'centroid_cm' in cached)
+                if results is not None:
+                    self.triangle_count = results['triangle_count']
+                    self.bounding_box_cm = results['bounding_box_cm']
+                    self.count_input(infilename)
+                    return results
+            stats = MeshStats(recenter=self.accuracy == 'high', mass_properties=self.mass_properties)
+            if self.is_binary_file and self.workers > 1 and data is None:
+                stats = self.analyze_parallel(infilename, chunk_size, f)
+            elif self.is_binary_file:
+                with self.progress(self.triangle_count, chunk_size, desc="Analyzing triangles") as pbar:
+                    for tri in STAGE_TIMER.timed_iter(self.iter_file_chunks(f, chunk_size, data), 'read'):
+                        with STAGE_TIMER.stage('compute'):
+                            stats.update(tri)
+                        pbar.update(len(tri))
+            else:
+                with self.progress(self.file_size, ASCII_READ_BLOCK, desc="Analyzing triangles", unit='B', unit_scale=True) as pbar:
+                    for tri in STAGE_TIMER.timed_iter(self.iter_ascii_chunks(f, on_bytes=pbar.update, data=data), 'parse'):
+                        with STAGE_TIMER.stage('compute'):
+                            stats.update(tri)
+                self.triangle_count = stats.triangle_count
+        if stats.triangle_count != self.triangle_count:
+            raise ValueError(f"file is truncated, expected {self.triangle_count} triangles")
+
+        self.count_input(infilename)
+        self.bounding_box_cm = stats.bounding_box_cm()
+        results = stats.results()
+        if self.cache is not None:
+            self.cache.put(key, results)
+        return results
+
+    def loadSTL(self, infilename, data=None):
+        self.triangles = np.empty((0, 3, 3), dtype=np.float32)
+        self.welded = None
+        with self.open_stl(infilename, data) as self.f:
             if self.is_binary_file:
-                with open(infilename, "rb") as self.f:
-                    self.f.seek(80) # Skip header
-                    self.triangle_count = struct.unpack("@i", self.f.read(4))[0]
-                    for _ in tqdm(range(self.triangle_count), desc="Reading triangles"):
-                        self.triangles.append(self.read_triangle_binary())
+                with STAGE_TIMER.stage('read'):
+                    if data is not None:
+                        records = self.buffer_facets(data, self.triangle_count)
+                    elif self.use_mmap and self.triangle_count > 0:
+                        records = self.map_binary_facets(self.f, self.triangle_count)
+                    else:
+                        records = self.read_binary_facets(self.triangle_count)
+                self.triangles = facet_vertices(records)
             else:
-                with open(infilename, 'r') as f:
-                    lines = f.readlines()
-                i = 0
-                ascii_triangles = []
-                with tqdm(total=len(lines), desc="Reading triangles") as pbar:
-                    while i < len(lines):
-                        if lines[i].strip().startswith('facet'):
-                            ascii_triangles.append(self.read_ascii_triangle(lines, i))
-                            pbar.update(7)
-                            i += 7
-                        else:
-                            pbar.update(1)
-                            i += 1
-                self.triangles = ascii_triangles
+                with STAGE_TIMER.stage('parse'), self.progress(self.file_size, ASCII_READ_BLOCK, desc="Reading triangles", unit='B', unit_scale=True) as pbar:
+                    blocks = list(self.iter_ascii_chunks(self.f, on_bytes=pbar.update, data=data))
+                if blocks:
+                    self.triangles = np.concatenate(blocks)
                 self.triangle_count = len(self.triangles)
-            
-            self._calculate_bounding_box()
+        self.count_input(infilename)
+        
+        self._calculate_bounding_box()
 
-        except Exception as e:
-            print(f"Error loading STL file: {e}")
-            sys.exit(1)
+    def count_input(self, infilename):
+        # Once per input file, so reloading it (e.g. for --validate) does not inflate bytes_read, facets and the rates
+        if self.counted_input != infilename:
+            self.counted_input = infilename
+            STAGE_TIMER.count('bytes_read', self.file_size)
+            STAGE_TIMER.count('facets', self.triangle_count)
+
+    def load_triangles(self, triangles):
+        """Use an in-memory (N, 3, 3) triangle array, e.g. an extracted iso-surface, instead of a file."""
+        self.triangles = np.asarray(triangles).reshape(-1, 3, 3)
+        self.triangle_count = len(self.triangles)
+        self.welded = None
+        self._calculate_bounding_box()
 
+    @timed_stage('export')
+    def save_binary_stl(self, outfilename, header=b'volume_calculator'):
+        """Write the loaded triangles as a binary STL file with per-facet normals."""
+        with open(outfilename, 'wb') as f:
+            f.write(header[:80].ljust(80, b' '))
+            f.write(struct.pack("<I", self.triangle_count))
+            for tri in self.iter_triangle_chunks():
+                records = np.zeros(len(tri), dtype=stl_facet_dtype())
+                normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+                lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+                records['normal'] = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+                records['v0'], records['v1'], records['v2'] = tri[:, 0], tri[:, 1], tri[:, 2]
+                records.tofile(f)
+
+    @timed_stage('bounds')
     def _calculate_bounding_box(self):
-        if not self.triangles:
+        if len(self.triangles) == 0:
             self.bounding_box_cm = {'width': 0, 'depth': 0, 'height': 0}
             return
 
-        first_vertex = self.triangles[0][0]
-        min_x, max_x = first_vertex[0], first_vertex[0]
-        min_y, max_y = first_vertex[1], first_vertex[1]
-        min_z, max_z = first_vertex[2], first_vertex[2]
-
-        for triangle in self.triangles:
-            for vertex in triangle:
-                min_x, max_x = min(min_x, vertex[0]), max(max_x, vertex[0])
-                min_y, max_y = min(min_y, vertex[1]), max(max_y, vertex[1])
-                min_z, max_z = min(min_z, vertex[2]), max(max_z, vertex[2])
-
-        width_cm = (max_x - min_x) / 10.0
-        depth_cm = (max_y - min_y) / 10.0
-        height_cm = (max_z - min_z) / 10.0
+        lo = np.full(3, np.inf)
+        hi = np.full(3, -np.inf)
+        for start in range(0, len(self.triangles), READ_CHUNK_FACETS):
+            vertices = self.triangles[start:start + READ_CHUNK_FACETS].reshape(-1, 3)
+            lo = np.minimum(lo, vertices.min(axis=0))
+            hi = np.maximum(hi, vertices.max(axis=0))
+        width_cm, depth_cm, height_cm = ((hi - lo) / 10.0).tolist()
 
         self.bounding_box_cm = {'width': width_cm, 'depth': depth_cm, 'height': height_cm}
 
+    @timed_stage('volume')
     def calculate_volume(self):
-        totalVolume = 0
-        for p1, p2, p3 in tqdm(self.triangles, desc="Calculating volume"):
-            totalVolume += self.signedVolumeOfTriangle(p1, p2, p3)
-        return totalVolume / 1000 # Return in cm³
+        totalVolume = CompensatedSum()
+        origin = None
+        for tri in self.iter_triangle_chunks():
+            if self.accuracy == 'high':
+                origin = block_center(tri) if origin is None else origin
+                tri = tri - origin
+            totalVolume.add(signed_volume_sum(tri))
+        return totalVolume.value() / 1000 # Return in cm³
 
     def calculate_mass(self, volume_cm3, density_g_cm3):
         return volume_cm3 * density_g_cm3
 
+    @timed_stage('area')
     def calculate_surface_area(self):
-        area = 0
-        for p1, p2, p3 in tqdm(self.triangles, desc="Calculating area  "):
-            ax, ay, az = p2[0] - p1[0], p2[1] - p1[1], p2[2] - p1[2]
-            bx, by, bz = p3[0] - p1[0], p3[1] - p1[1], p3[2] - p1[2]
-            cx, cy, cz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
-            area += 0.5 * (cx * cx + cy * cy + cz * cz)**0.5
-        return area / 100 # Return in cm²
+        area = CompensatedSum()
+        for tri in self.iter_triangle_chunks():
+            area.add(surface_area_sum(tri))
+        return area.value() / 100 # Return in cm²
+
+    def weld(self, tolerance=WELD_TOLERANCE_MM):
+        """Welded (faces, vertex_count) of the loaded triangles, computed once per tolerance."""
+        if self.welded is None or self.welded[0] != tolerance:
+            self.welded = (tolerance, *weld_vertices(self.triangles, tolerance))
+        return self.welded[1:]
+
+    @timed_stage('split_bodies')
+    def split_bodies(self, tolerance=WELD_TOLERANCE_MM):
+        """Split the loaded mesh into connected bodies; returns one dict per body in cm units."""
+        faces, vertex_count = self.weld(tolerance)
+        face_labels, body_count = label_components(faces, vertex_count)
+        stats = component_stats(self.triangles, face_labels, body_count)
+        bodies = []
+        for body in range(body_count):
+            lower, upper = stats['lower'][body] / 10.0, stats['upper'][body] / 10.0
+            width_cm, depth_cm, height_cm = (upper - lower).tolist()
+            bodies.append({
+                'id': body + 1,
+                'triangle_count': int(stats['triangle_count'][body]),
+                'volume_cm3': float(stats['volume'][body]) / 1000,
+                'surface_area_cm2': float(stats['area'][body]) / 100,
+                'bounding_box_cm': {'width': width_cm, 'depth': depth_cm, 'height': height_cm},
+                'bounds_cm': {'min': lower.tolist(), 'max': upper.tolist()},
+            })
+        return bodies
+
+    @timed_stage('validate')
+    def validate(self, tolerance=WELD_TOLERANCE_MM, volume_cm3=None):
+        """Check that the loaded mesh is a closed, consistently oriented 2-manifold.
+
+        The volume of a mesh is only meaningful when every edge is shared by exactly
+        two faces that traverse it in opposite directions and the signed volume is
+        positive (outward-facing normals). A mesh without faces encloses nothing and
+        is never valid.
+        """
+        faces, vertex_count = self.weld(tolerance)
+        report = {'face_count': len(faces), 'vertex_count': vertex_count}
+        report.update(edge_report(faces, vertex_count))
+        if volume_cm3 is None:
+            volume_cm3 = self.calculate_volume()
+        report['negative_volume'] = bool(volume_cm3 < 0)
+        report['watertight'] = (report['face_count'] > 0 and report['boundary_edges'] == 0
+                                and report['non_manifold_edges'] == 0)
+        report['valid'] = (report['watertight'] and report['inconsistent_winding_edges'] == 0
+                           and not report['negative_volume'])
+        return report
 
     @staticmethod
     def cm3_to_inch3(v):
         return v * 0.0610237441
 
-def main():
+def import_medical(name):
+    """Import one of the optional medical imaging packages (nibabel, pydicom, skimage)."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ModuleNotFoundError(
+            f"{name} is required for NIfTI/DICOM input. Please install it: pip install \"stl-volume-calculator[medical]\""
+        )
+
+# Slices per marching-cubes block; neighbouring blocks share one slice
+ISOSURFACE_BLOCK_SLICES = 64
+
+def extract_isosurface(mask, voxel_size_mm, block_slices=ISOSURFACE_BLOCK_SLICES, workers=1, show_progress=True):
+    """Triangulate the boundary of an (x, y, z) boolean mask with marching cubes, in parallel z blocks.
+
+    The mask is treated as surrounded by empty voxels so the surface is closed. Each block
+    overlaps the next by one slice, so every marching cube is processed by exactly one block
+    and the per-block triangle soups can simply be concatenated. Returns an (N, 3, 3) array
+    in mm with outward-facing winding.
+    """
+    measure = import_medical('skimage.measure')
+    size_x, size_y, size_z = mask.shape
+    spacing = np.asarray(voxel_size_mm, dtype=np.float64)
+    # Block boundaries in padded z coordinates (padded slice p is mask slice p - 1)
+    edges = list(range(0, size_z + 1, block_slices)) + [size_z + 1]
+    edges = sorted(set(edges))
+    blocks = list(zip(edges[:-1], edges[1:]))
+
+    def triangulate(block):
+        start, stop = block
+        padded = np.zeros((size_x + 2, size_y + 2, stop - start + 1), dtype=np.float32)
+        lo, hi = max(start - 1, 0), min(stop - 1, size_z - 1)
+        if hi >= lo:
+            padded[1:-1, 1:-1, lo + 1 - start:hi + 2 - start] = mask[:, :, lo:hi + 1]
+        if not padded.any():
+            return np.empty((0, 3, 3))
+        verts, faces, _, _ = measure.marching_cubes(padded, level=0.5, spacing=tuple(spacing), allow_degenerate=False)
+        # Back to unpadded voxel coordinates; reversed faces give outward normals
+        verts += (np.array([-1.0, -1.0, start - 1.0]) * spacing)
+        return verts[faces[:, ::-1]]
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with progress_bar(total=len(blocks), desc="Extracting surface", disable=not show_progress) as pbar:
+            parts = []
+            for part in pool.map(triangulate, blocks):
+                parts.append(part)
+                pbar.update(1)
+    return np.concatenate(parts) if parts else np.empty((0, 3, 3))
+
+class VoxelUtils:
+    """Segmented volume of NIfTI and DICOM images, measured by counting voxels."""
+    # Bytes of decoded image data processed per slab
+    SLAB_BYTES = 64 << 20
+
+    def __init__(self, threshold=None, labels=None, volume_index=0, workers=1, show_progress=True, keep_mask=False):
+        self.threshold = 0.0 if threshold is None else threshold
+        self.labels = labels
+        self.volume_index = volume_index
+        self.workers = workers
+        self.show_progress = show_progress
+        self.keep_mask = keep_mask
+        self.mask = None # (x, y, z) segmentation, kept only when keep_mask is set
+        self.file_size = 0
+        self.shape = None
+        self.voxel_size_mm = None
+        self.voxel_count = 0
+        self.lower = None # first segmented voxel index per axis
+        self.upper = None # last segmented voxel index per axis
+
+    def segment(self, data):
+        """Boolean mask of the voxels that belong to the measured object."""
+        if self.labels:
+            return np.isin(data, self.labels)
+        return data > self.threshold
+
+    def _accumulate(self, mask, z_offset):
+        count = int(np.count_nonzero(mask))
+        if count == 0:
+            return
+        self.voxel_count += count
+        lower = []
+        upper = []
+        for axis in range(3):
+            others = tuple(a for a in range(3) if a != axis)
+            hits = np.flatnonzero(mask.any(axis=others))
+            lower.append(hits[0])
+            upper.append(hits[-1])
+        lower[2] += z_offset
+        upper[2] += z_offset
+        self.lower = np.array(lower) if self.lower is None else np.minimum(self.lower, lower)
+        self.upper = np.array(upper) if self.upper is None else np.maximum(self.upper, upper)
+
+    @timed_stage('voxels')
+    def analyze_nifti(self, filename):
+        """Count segmented voxels slab by slab from nibabel's lazy array proxy."""
+        nib = import_medical('nibabel')
+        self.file_size = os.path.getsize(filename)
+        img = nib.load(filename)
+        if len(img.shape) not in (3, 4):
+            raise ValueError(f"expected a 3D or 4D image, got shape {img.shape}")
+        if len(img.shape) == 4 and not 0 <= self.volume_index < img.shape[3]:
+            raise ValueError(f"--volume-index {self.volume_index} is out of range for {img.shape[3]} volumes")
+        self.shape = tuple(img.shape[:3])
+        self.voxel_size_mm = [float(zoom) for zoom in img.header.get_zooms()[:3]]
+        self.voxel_count = 0
+        self.lower = self.upper = None
+
+        # Slabs of whole XY slices, sized so the float64-scaled data stays bounded
+        slab = max(1, self.SLAB_BYTES // (self.shape[0] * self.shape[1] * 8))
+        volume = (self.volume_index,) if len(img.shape) == 4 else ()
+        # One byte per voxel, needed only for surface extraction
+        self.mask = np.zeros(self.shape, dtype=bool) if self.keep_mask else None
+        with progress_bar(total=self.shape[2], desc="Reading slices", disable=not self.show_progress) as pbar:
+            for z0 in range(0, self.shape[2], slab):
+                data = np.asarray(img.dataobj[(slice(None), slice(None), slice(z0, z0 + slab)) + volume])
+                mask = self.segment(data)
+                self._accumulate(mask, z0)
+                if self.mask is not None:
+                    self.mask[:, :, z0:z0 + mask.shape[2]] = mask
+                pbar.update(data.shape[2])
+        return self.results()
+
+    def read_dicom_headers(self, directory):
+        """Read the headers (no pixel data) of every DICOM file in a directory, sorted along the slice normal."""
+        pydicom = import_medical('pydicom')
+        paths = sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+        if not paths:
+            raise ValueError(f"no files found in {directory}")
+
+        def read_header(path):
+            try:
+                return path, pydicom.dcmread(path, stop_before_pixels=True)
+            except pydicom.errors.InvalidDicomError:
+                return path, None
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(self.workers, 4)) as pool:
+            headers = [(path, ds) for path, ds in pool.map(read_header, paths) if ds is not None and 'Rows' in ds]
+        if not headers:
+            raise ValueError(f"no DICOM images found in {directory}")
+
+        # Directories sometimes mix series; measure the one with the most slices
+        series = {}
+        for path, ds in headers:
+            series.setdefault(ds.get('SeriesInstanceUID', ''), []).append((path, ds))
+        headers = max(series.values(), key=len)
+
+        first = headers[0][1]
+        if 'ImageOrientationPatient' in first and all('ImagePositionPatient' in ds for _, ds in headers):
+            orientation = np.array(first.ImageOrientationPatient, dtype=np.float64)
+            normal = np.cross(orientation[:3], orientation[3:])
+            positions = np.array([np.dot(normal, np.array(ds.ImagePositionPatient, dtype=np.float64)) for _, ds in headers])
+        else:
+            positions = np.array([float(ds.get('InstanceNumber', 0)) for _, ds in headers]) * float(first.get('SliceThickness', 1.0))
+        order = np.argsort(positions, kind='stable')
+        headers = [headers[i] for i in order]
+        positions = positions[order]
+
+        if any((ds.Rows, ds.Columns) != (first.Rows, first.Columns) for _, ds in headers):
+            raise ValueError("slices in the series have different dimensions")
+        if len(headers) > 1:
+            gaps = np.diff(positions)
+            slice_spacing = float(np.median(gaps))
+            if slice_spacing <= 0 or np.abs(gaps - slice_spacing).max() > 0.01 * slice_spacing:
+                raise ValueError("slice spacing in the series is not uniform")
+        else:
+            slice_spacing = float(first.get('SliceThickness', 1.0))
+        row_spacing, column_spacing = (float(v) for v in first.get('PixelSpacing', [1.0, 1.0]))
+        self.voxel_size_mm = [column_spacing, row_spacing, slice_spacing]
+        return headers
+
+    def load_dicom_series(self, directory):
+        """Decode a DICOM series into a preallocated (slices, rows, columns) array, slices in parallel."""
+        pydicom = import_medical('pydicom')
+        headers = self.read_dicom_headers(directory)
+        paths = [path for path, _ in headers]
+        first = headers[0][1]
+        volume = np.empty((len(paths), first.Rows, first.Columns), dtype=np.float32)
+
+        def decode(index):
+            ds = pydicom.dcmread(paths[index])
+            slope = float(ds.get('RescaleSlope', 1.0))
+            intercept = float(ds.get('RescaleIntercept', 0.0))
+            np.multiply(ds.pixel_array, slope, out=volume[index], casting='unsafe')
+            volume[index] += intercept
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            with progress_bar(total=len(paths), desc="Decoding slices", disable=not self.show_progress) as pbar:
+                for _ in pool.map(decode, range(len(paths))):
+                    pbar.update(1)
+        return volume
+
+    @timed_stage('voxels')
+    def analyze_dicom(self, directory):
+        """Measure the segmented volume of a DICOM series directory."""
+        self.file_size = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+        )
+        volume = self.load_dicom_series(directory)
+        self.shape = volume.shape[::-1]
+        self.voxel_count = 0
+        self.lower = self.upper = None
+        # (slices, rows, columns) -> (x, y, z) to match the NIfTI axis order
+        mask = self.segment(volume).transpose(2, 1, 0)
+        self._accumulate(mask, 0)
+        self.mask = mask if self.keep_mask else None
+        return self.results()
+
+    @timed_stage('surface')
+    def extract_surface(self):
+        """Iso-surface of the segmentation as an STLUtils mesh, so the usual area/volume/bounds code applies."""
+        if self.mask is None:
+            raise ValueError("the segmentation mask was not kept; create VoxelUtils with keep_mask=True")
+        mesh = STLUtils(show_progress=self.show_progress)
+        mesh.load_triangles(
+            extract_isosurface(self.mask, self.voxel_size_mm, workers=self.workers, show_progress=self.show_progress)
+        )
+        return mesh
+
+    def bounding_box_cm(self):
+        if self.voxel_count == 0:
+            return {'width': 0, 'depth': 0, 'height': 0}
+        width_cm, depth_cm, height_cm = ((self.upper - self.lower + 1) * self.voxel_size_mm / 10.0).tolist()
+        return {'width': width_cm, 'depth': depth_cm, 'height': height_cm}
+
+    def results(self):
+        voxel_volume_mm3 = float(np.prod(self.voxel_size_mm))
+        return {
+            'voxel_count': self.voxel_count,
+            'voxel_size_mm': self.voxel_size_mm,
+            'bounding_box_cm': self.bounding_box_cm(),
+            'volume_cm3': self.voxel_count * voxel_volume_mm3 / 1000,
+        }
+
+def analyze_volume_file(filename, args, show_progress=True):
+    """Analyze a NIfTI image or DICOM series and return a result record in the same schema as the STL path."""
+    materials = open_material_catalog(args)
+    want_surface = args.surface or args.export_stl is not None or args.calculation == 'area'
+    myVoxelUtils = VoxelUtils(
+        threshold=args.threshold, labels=args.label, volume_index=args.volume_index,
+        workers=args.workers, show_progress=show_progress, keep_mask=want_surface
+    )
+    if args.filetype == 'dcm':
+        stats = myVoxelUtils.analyze_dicom(filename)
+    else:
+        stats = myVoxelUtils.analyze_nifti(filename)
+    bbox = stats['bounding_box_cm']
+    volume_cm3 = stats['volume_cm3']
+
+    surface = None
+    if want_surface:
+        surface = myVoxelUtils.extract_surface()
+        if args.export_stl:
+            surface.save_binary_stl(args.export_stl)
+
+    if args.calculation is None:
+        results = {
+            "file_information": {
+                "filename": os.path.basename(filename),
+                "file_size_kb": f"{myVoxelUtils.file_size / 1024:.2f}"
+            },
+            "model_properties": {
+                "voxel_count": stats['voxel_count'],
+                "voxel_size_mm": stats['voxel_size_mm'],
+                "bounding_box_cm": {
+                    "width": f"{bbox['width']:.2f}",
+                    "depth": f"{bbox['depth']:.2f}",
+                    "height": f"{bbox['height']:.2f}"
+                },
+                "volume_cm3": f"{volume_cm3:.4f}",
+                "volume_inch3": f"{STLUtils.cm3_to_inch3(volume_cm3):.4f}"
+            },
+            "mass_estimates": build_mass_estimates(volume_cm3, args.infill, materials)
+        }
+        if surface is not None:
+            results["model_properties"].update({
+                "triangle_count": surface.triangle_count,
+                "surface_area_cm2": f"{surface.calculate_surface_area():.4f}",
+                "surface_mesh_volume_cm3": f"{surface.calculate_volume():.4f}"
+            })
+        return results
+
+    results = {"file": filename, "calculation": args.calculation, "bounding_box_cm": bbox}
+    if args.calculation == 'volume':
+        results.update(build_volume_calculation(volume_cm3, args, materials))
+    elif args.calculation == 'area':
+        results["surface_area_cm2"] = f"{surface.calculate_surface_area():.4f}"
+    return results
+
+def analyze_file(filename, args, show_progress=True, data=None):
+    if args.filetype == 'stl':
+        return analyze_stl_file(filename, args, show_progress, data)
+    return analyze_volume_file(filename, args, show_progress)
+
+def open_result_cache(args):
+    """Return the ResultCache selected on the command line, or None when caching is off."""
+    cache_dir = args.cache_dir or os.environ.get('VOLUME_CALCULATOR_CACHE_DIR')
+    if args.no_cache or not cache_dir:
+        return None
+    return ResultCache(cache_dir, max_entries=args.cache_max_entries)
+
+def configure_instrumentation(args):
+    """Enable STAGE_TIMER for --timings / --trace; it is a no-op otherwise."""
+    STAGE_TIMER.enabled = args.timings or args.trace is not None
+    STAGE_TIMER.tracing = args.trace is not None
+
+def write_trace(path, events):
+    """Write trace events in the Chrome trace-event format (chrome://tracing, Perfetto)."""
+    with open(path, 'w') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def open_material_catalog(args):
+    """Return the material catalog selected on the command line (--materials-file or $VOLUME_CALCULATOR_MATERIALS)."""
+    return load_material_catalog(args.materials_file or os.environ.get('VOLUME_CALCULATOR_MATERIALS'))
+
+def mass_table(volumes_cm3, densities_g_cm3, infill_percents=(100.0,)):
+    """Mass (g) of every volume in every material at every infill level, as one broadcast grid.
+
+    Returns an array of shape (volumes, densities, infills); scalars count as
+    length-1 axes. Quoting thousands of parts against every material and an
+    infill sweep is a single vectorized multiply.
+    """
+    volumes = np.atleast_1d(np.asarray(volumes_cm3, dtype=np.float64))
+    densities = np.atleast_1d(np.asarray(densities_g_cm3, dtype=np.float64))
+    infills = np.atleast_1d(np.asarray(infill_percents, dtype=np.float64)) / 100.0
+    return (volumes[:, None, None] * infills[None, None, :]) * densities[None, :, None]
+
+def build_mass_estimates(volume_cm3, infill, materials):
+    """Mass of a solid volume for every material, at the given infill and at 100% infill."""
+    masses = mass_table(volume_cm3, materials.densities, (infill, 100.0))[0]
+    # MODIFIED: Changed to a more structured and explicit JSON format
+    return [
+        {
+            "id": mat_id,
+            "name": name,
+            "density_g_cm3": density,
+            "mass_at_infill": {
+                "infill_percent": infill,
+                "mass_g": f"{mass_infill:.3f}"
+            },
+            "mass_at_100_infill": {
+                "infill_percent": 100.0,
+                "mass_g": f"{mass_solid:.3f}"
+            }
+        }
+        for mat_id, name, density, (mass_infill, mass_solid)
+        in zip(materials.id_list, materials.names, materials.density_list, masses.tolist())
+    ]
+
+def build_volume_calculation(volume_cm3, args, materials):
+    """Result fields of `--calculation volume` for the selected material."""
+    material_info = materials.get_material_info(args.material)
+    mass_g_infill, mass_g_solid = mass_table(volume_cm3, material_info['mass'], (args.infill, 100.0))[0, 0].tolist()
+    # MODIFIED: Changed to a more structured and explicit JSON format
+    return {
+        "volume_cm3": f"{volume_cm3:.4f}",
+        "volume_inch3": f"{STLUtils.cm3_to_inch3(volume_cm3):.4f}",
+        "material_name": material_info['name'],
+        "mass_at_infill": {
+            "infill_percent": args.infill,
+            "mass_g": f"{mass_g_infill:.3f}"
+        },
+        "mass_at_100_infill": {
+            "infill_percent": 100.0,
+            "mass_g": f"{mass_g_solid:.3f}"
+        }
+    }
+
+def build_mass_properties(stats, material_info):
+    """Centroid and inertia tensor of the solid (100% infill) model in the selected material."""
+    density = material_info['mass']
+    tensor = inertia_tensor(stats['second_moment_cm5'], density)
+    principal = np.linalg.eigvalsh(tensor)
+    return {
+        "material_name": material_info['name'],
+        "density_g_cm3": density,
+        "mass_g": f"{stats['volume_cm3'] * density:.3f}",
+        "centroid_cm": {axis: f"{value:.4f}" for axis, value in zip('xyz', stats['centroid_cm'])},
+        "inertia_tensor_g_cm2": [[f"{value:.4f}" for value in row] for row in tensor],
+        "principal_moments_g_cm2": [f"{value:.4f}" for value in principal]
+    }
+
+def build_body_records(bodies, infill, material_info):
+    """Per-body result records, with the mass of each body in the selected material."""
+    masses = mass_table([body['volume_cm3'] for body in bodies], material_info['mass'], (infill, 100.0))[:, 0]
+    records = []
+    for body, (mass_infill, mass_solid) in zip(bodies, masses.tolist()):
+        volume_cm3 = body['volume_cm3']
+        bbox = body['bounding_box_cm']
+        records.append({
+            "id": body['id'],
+            "triangle_count": body['triangle_count'],
+            "bounding_box_cm": {
+                "width": f"{bbox['width']:.2f}",
+                "depth": f"{bbox['depth']:.2f}",
+                "height": f"{bbox['height']:.2f}"
+            },
+            "bounds_cm": {corner: [f"{value:.2f}" for value in values] for corner, values in body['bounds_cm'].items()},
+            "surface_area_cm2": f"{body['surface_area_cm2']:.4f}",
+            "volume_cm3": f"{volume_cm3:.4f}",
+            "material_name": material_info['name'],
+            "mass_at_infill": {
+                "infill_percent": infill,
+                "mass_g": f"{mass_infill:.3f}"
+            },
+            "mass_at_100_infill": {
+                "infill_percent": 100.0,
+                "mass_g": f"{mass_solid:.3f}"
+            }
+        })
+    return records
+
+def analyze_stl_file(filename, args, show_progress=True, data=None):
+    """Analyze one STL file and return the result record printed by the CLI; `data` is its prefetched content."""
+    materials = open_material_catalog(args)
+    is_full_analysis_mode = args.calculation is None
+    cache = open_result_cache(args)
+    mySTLUtils = STLUtils(
+        use_mmap=args.mmap, workers=args.workers, show_progress=show_progress, cache=cache, accuracy=args.accuracy,
+        mass_properties=is_full_analysis_mode and args.mass_properties
+    )
+    # With a cache, every mode goes through analyze() so repeat runs skip parsing
+    stats = None
+    if is_full_analysis_mode or cache is not None:
+        stats = mySTLUtils.analyze(filename, data=data)
+    else:
+        mySTLUtils.loadSTL(filename, data)
+    bbox = mySTLUtils.bounding_box_cm
+    results = {}
+
+    if is_full_analysis_mode:
+        # --- FULL ANALYSIS MODE (DEFAULT) ---
+        volume_cm3 = stats['volume_cm3']
+        area_cm2 = stats['surface_area_cm2']
+
+        results = {
+            "file_information": {
+                "filename": os.path.basename(filename),
+                "file_size_kb": f"{mySTLUtils.file_size / 1024:.2f}"
+            },
+            "model_properties": {
+                "triangle_count": mySTLUtils.triangle_count,
+                "bounding_box_cm": {
+                    "width": f"{bbox['width']:.2f}",
+                    "depth": f"{bbox['depth']:.2f}",
+                    "height": f"{bbox['height']:.2f}"
+                },
+                "surface_area_cm2": f"{area_cm2:.4f}",
+                "volume_cm3": f"{volume_cm3:.4f}",
+                "volume_inch3": f"{mySTLUtils.cm3_to_inch3(volume_cm3):.4f}"
+            },
+            "mass_estimates": build_mass_estimates(volume_cm3, args.infill, materials)
+        }
+        if args.mass_properties:
+            results["mass_properties"] = build_mass_properties(stats, materials.get_material_info(args.material))
+
+    else:
+        # --- SPECIFIC CALCULATION MODE ---
+        results = {"file": filename, "calculation": args.calculation, "bounding_box_cm": bbox}
+        if args.calculation == 'volume':
+            volume_cm3 = stats['volume_cm3'] if stats else mySTLUtils.calculate_volume()
+            results.update(build_volume_calculation(volume_cm3, args, materials))
+        elif args.calculation == 'area':
+            area_cm2 = stats['surface_area_cm2'] if stats else mySTLUtils.calculate_surface_area()
+            results["surface_area_cm2"] = f"{area_cm2:.4f}"
+
+    if args.validate or args.split_bodies:
+        # Welding needs every triangle in memory, which the streaming pass does not keep
+        if len(mySTLUtils.triangles) != mySTLUtils.triangle_count:
+            with STAGE_TIMER.stage('reload'):
+                mySTLUtils.loadSTL(filename, data)
+    if args.validate:
+        volume_cm3 = stats['volume_cm3'] if stats else None
+        results["validation"] = mySTLUtils.validate(args.weld_tolerance, volume_cm3)
+    if args.split_bodies:
+        bodies = mySTLUtils.split_bodies(args.weld_tolerance)
+        results["bodies"] = build_body_records(bodies, args.infill, materials.get_material_info(args.material))
+
+    return results
+
+def print_results_table(results, args):
+    Console, Table, box = load_rich()
+    console = Console()
+    if args.calculation is None:
+        props = results['model_properties']
+        info_table = Table(title=f"Model Analysis: {results['file_information']['filename']}", show_header=False, header_style="bold cyan", box=box.ROUNDED)
+        info_table.add_column("Property", style="dim")
+        info_table.add_column("Value")
+        info_table.add_row("File Size", f"{results['file_information']['file_size_kb']} KB")
+        if 'triangle_count' in props:
+            info_table.add_row("Triangles", f"{props['triangle_count']:,}")
+        if 'voxel_count' in props:
+            info_table.add_row("Voxels", f"{props['voxel_count']:,}")
+            info_table.add_row("Voxel Size (mm)", " x ".join(f"{size:.3f}" for size in props['voxel_size_mm']))
+        bbox_str = f"W: {props['bounding_box_cm']['width']}, D: {props['bounding_box_cm']['depth']}, H: {props['bounding_box_cm']['height']}"
+        info_table.add_row("Bounding Box (cm)", bbox_str)
+        if 'surface_area_cm2' in props:
+            info_table.add_row("Surface Area", f"{props['surface_area_cm2']} cm²")
+        volume_display = f"{props['volume_inch3']} inch³" if args.unit == 'inch' else f"{props['volume_cm3']} cm³"
+        info_table.add_row(f"Volume (solid)", volume_display)
+        console.print(info_table)
+
+        mass_table = Table(title="Mass Estimates for All Materials With selected infill and 100% infill", show_header=True, header_style="bold magenta")
+        mass_table.add_column("ID", style="dim", width=4)
+        mass_table.add_column("Material Name")
+        mass_table.add_column("Density", justify="right")
+        mass_table.add_column(f"Mass @ {args.infill:.1f}% (g)", justify="right")
+        mass_table.add_column("Mass @ 100% (g)", justify="right")
+        
+        # MODIFIED: Accessing data from the new structure for the table
+        for item in results['mass_estimates']:
+            mass_table.add_row(
+                str(item['id']), 
+                item['name'], 
+                f"{item['density_g_cm3']:.3f}", 
+                item['mass_at_infill']['mass_g'],
+                item['mass_at_100_infill']['mass_g']
+            )
+        console.print(mass_table)
+
+        if 'mass_properties' in results:
+            mass_props = results['mass_properties']
+            centroid = mass_props['centroid_cm']
+            inertia_table = Table(title=f"Mass Properties: {mass_props['material_name']} @ 100% infill ({mass_props['mass_g']} g)", show_header=True, header_style="bold green", box=box.ROUNDED)
+            inertia_table.add_column("Inertia (g·cm²)", style="dim")
+            for axis in 'xyz':
+                inertia_table.add_column(axis.upper(), justify="right")
+            for axis, row in zip('xyz', mass_props['inertia_tensor_g_cm2']):
+                inertia_table.add_row(axis.upper(), *row)
+            inertia_table.add_row("Principal", *mass_props['principal_moments_g_cm2'])
+            inertia_table.add_row("Centroid (cm)", centroid['x'], centroid['y'], centroid['z'])
+            console.print(inertia_table)
+    else: # Specific calculation table
+        bbox = results['bounding_box_cm']
+        if args.calculation == 'volume':
+            table = Table(title="Volume & Mass Calculation", show_header=False, box=box.ROUNDED)
+            table.add_column("Property", style="dim")
+            table.add_column("Value")
+            table.add_row("Bounding Box (cm)", f"W: {bbox['width']:.2f}, D: {bbox['depth']:.2f}, H: {bbox['height']:.2f}")
+            volume_display = f"{results['volume_inch3']} inch³" if args.unit == 'inch' else f"{results['volume_cm3']} cm³"
+            table.add_row("Volume (solid)", volume_display)
+            table.add_row("Material", f"{results['material_name']} (ID: {args.material})")
+            # MODIFIED: Accessing data from the new structure for the table
+            table.add_row(f"Mass ({args.infill:.1f}% Infill)", f"{results['mass_at_infill']['mass_g']} g")
+            table.add_row("Mass (100% Infill)", f"{results['mass_at_100_infill']['mass_g']} g")
+            console.print(table)
+        elif args.calculation == 'area':
+            table = Table(title="Surface Area Calculation", show_header=False, box=box.ROUNDED)
+            table.add_column("Property", style="dim")
+            table.add_column("Value")
+            table.add_row("Bounding Box (cm)", f"W: {bbox['width']:.2f}, D: {bbox['depth']:.2f}, H: {bbox['height']:.2f}")
+            table.add_row("Surface Area", f"{results['surface_area_cm2']} cm²")
+            console.print(table)
+
+    if 'bodies' in results:
+        print_bodies_table(console, results['bodies'], args)
+    if 'validation' in results:
+        print_validation_table(console, results['validation'])
+
+def print_bodies_table(console, bodies, args):
+    _, Table, box = load_rich()
+    material = bodies[0]['material_name'] if bodies else ""
+    table = Table(title=f"Bodies: {len(bodies):,} ({material})", show_header=True, header_style="bold magenta")
+    table.add_column("ID", style="dim", justify="right")
+    table.add_column("Triangles", justify="right")
+    table.add_column("W x D x H (cm)", no_wrap=True)
+    table.add_column("Surface Area (cm²)", justify="right")
+    table.add_column("Volume (cm³)", justify="right")
+    table.add_column(f"Mass @ {args.infill:.1f}% (g)", justify="right")
+    table.add_column("Mass @ 100% (g)", justify="right")
+    for body in bodies:
+        bbox = body['bounding_box_cm']
+        table.add_row(
+            str(body['id']),
+            f"{body['triangle_count']:,}",
+            f"{bbox['width']}x{bbox['depth']}x{bbox['height']}",
+            body['surface_area_cm2'],
+            body['volume_cm3'],
+            body['mass_at_infill']['mass_g'],
+            body['mass_at_100_infill']['mass_g']
+        )
+    console.print(table)
+
+def print_validation_table(console, validation):
+    _, Table, box = load_rich()
+    status = "[green]valid[/green]" if validation['valid'] else "[red]invalid: volume is not reliable[/red]"
+    table = Table(title="Mesh Validation", show_header=False, box=box.ROUNDED)
+    table.add_column("Check", style="dim")
+    table.add_column("Value", justify="right")
+    table.add_row("Faces", f"{validation['face_count']:,}")
+    table.add_row("Welded Vertices", f"{validation['vertex_count']:,}")
+    table.add_row("Edges", f"{validation['edge_count']:,}")
+    table.add_row("Boundary Edges", f"{validation['boundary_edges']:,}")
+    table.add_row("Non-manifold Edges", f"{validation['non_manifold_edges']:,}")
+    table.add_row("Inconsistent Winding Edges", f"{validation['inconsistent_winding_edges']:,}")
+    table.add_row("Degenerate Faces", f"{validation['degenerate_faces']:,}")
+    table.add_row("Negative Volume", "yes" if validation['negative_volume'] else "no")
+    table.add_row("Watertight", "yes" if validation['watertight'] else "no")
+    table.add_row("Status", status)
+    console.print(table)
+
+# File extensions picked up when a directory is given in batch mode
+BATCH_EXTENSIONS = {'stl': ('.stl',), 'nii': ('.nii', '.nii.gz')}
+
+def expand_input_paths(paths, extensions=BATCH_EXTENSIONS['stl']):
+    """Expand files, directories (recursively) and glob patterns into a sorted, de-duplicated file list."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.extend(os.path.join(root, name) for name in names if name.lower().endswith(extensions))
+        elif glob.has_magic(path):
+            found.extend(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+        else:
+            found.append(path)
+    return sorted(dict.fromkeys(found))
+
+def analyze_batch_entry(filename, args, data=None):
+    """Batch worker: analyze one file and turn failures into an error record instead of raising."""
+    configure_instrumentation(args)
+    STAGE_TIMER.reset()
+    try:
+        record = {"file": filename, "status": "ok", "results": analyze_file(filename, args, show_progress=False, data=data)}
+    except Exception as e:
+        record = {"file": filename, "status": "error", "error": str(e)}
+    if args.timings:
+        record["timings"] = STAGE_TIMER.report()
+    if args.trace:
+        # Handed back to the parent process, which writes one trace for the whole batch
+        record["trace_events"] = STAGE_TIMER.take_events()
+    return record
+
+def file_size_or_none(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return None
+
+def start_shared_memory_tracker():
+    """Start the resource tracker before a process pool does, so its workers share it.
+
+    A worker started without it runs its own tracker, which reports every segment
+    the worker attached to as leaked and unlinks it a second time on exit.
+    """
+    from multiprocessing import resource_tracker
+    resource_tracker.ensure_running()
+
+def create_shared(size):
+    """New shared memory segment for `size` bytes; worker processes attach to it by name, so the content is never pickled."""
+    from multiprocessing import shared_memory
+    return shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+def release_shared(segment):
+    segment.close()
+    segment.unlink()
+
+def read_into(stream, buffer, size):
+    """Read up to `size` bytes of a stream into a writable buffer; returns the count, smaller if the stream ended early."""
+    view = memoryview(buffer)
+    try:
+        length = 0
+        while length < size:
+            count = stream.readinto(view[length:min(size, length + READ_BLOCK_BYTES)])
+            if not count:
+                break
+            length += count
+        return length
+    finally:
+        view.release()
+
+def analyze_shared_entry(filename, args, segment_name, length):
+    """Batch worker for content the parent placed in a shared memory segment."""
+    from multiprocessing import shared_memory
+    segment = shared_memory.SharedMemory(name=segment_name)
+    data = segment.buf[:length]
+    try:
+        return analyze_batch_entry(filename, args, data)
+    finally:
+        # Arrays viewing the segment died with the analysis; release before detaching
+        data.release()
+        segment.close()
+
+def prefetch_file(filename, buffer, size):
+    """Read a whole file into `buffer` for the batch ingestion; None leaves unreadable files to the worker to report."""
+    try:
+        with open(filename, 'rb') as f:
+            return read_into(f, buffer, size)
+    except OSError:
+        return None
+
+async def ingest_batch(filenames, args, pool, on_done):
+    """Read files ahead on I/O threads while `pool` analyzes those already in memory.
+
+    Prefetched content is bounded by --prefetch-mb: a file is read only when its
+    size fits in the budget left by files still waiting for or in analysis, and
+    files larger than the whole budget are streamed by their worker instead. Up to
+    --prefetch files are read at once. Worker processes receive the content through
+    shared memory rather than as a pickled copy. Records are returned in input order.
+    """
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    loop = asyncio.get_running_loop()
+    shared = isinstance(pool, ProcessPoolExecutor)
+    if shared:
+        start_shared_memory_tracker()
+    budget = int(args.prefetch_mb * 1e6)
+    reserved = 0
+    room = asyncio.Condition()
+    reads = asyncio.Semaphore(args.prefetch)
+    with ThreadPoolExecutor(max_workers=args.prefetch, thread_name_prefix='prefetch') as readers:
+        async def analyze_prefetched(filename, size):
+            # Segments are created on this thread, which also forks the pool's workers: a reader thread
+            # holding the resource tracker's lock during a fork would deadlock the child
+            segment = create_shared(size) if shared else None
+            try:
+                buffer = segment.buf if shared else bytearray(size)
+                async with reads:
+                    length = await loop.run_in_executor(readers, prefetch_file, filename, buffer, size)
+                if length is None:
+                    return await loop.run_in_executor(pool, analyze_batch_entry, filename, args)
+                if shared:
+                    return await loop.run_in_executor(pool, analyze_shared_entry, filename, args, segment.name, length)
+                data = buffer if length == size else memoryview(buffer)[:length]
+                return await loop.run_in_executor(pool, analyze_batch_entry, filename, args, data)
+            finally:
+                if shared:
+                    release_shared(segment)
+
+        async def ingest(filename):
+            nonlocal reserved
+            size = await loop.run_in_executor(readers, file_size_or_none, filename)
+            if size is None or size > budget:
+                record = await loop.run_in_executor(pool, analyze_batch_entry, filename, args)
+            else:
+                async with room:
+                    await room.wait_for(lambda: reserved + size <= budget)
+                    reserved += size
+                try:
+                    record = await analyze_prefetched(filename, size)
+                finally:
+                    async with room:
+                        reserved -= size
+                        room.notify_all()
+            on_done(record)
+            return record
+        return await asyncio.gather(*(ingest(filename) for filename in filenames))
+
+def run_batch(filenames, args):
+    """Analyze many files with a bounded worker pool; returns per-file records and a summary."""
+    start = time.perf_counter()
+    if args.prefetch > 0 and args.filetype == 'stl':
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        # A single job still runs off the event loop so reads keep overlapping with it
+        pool = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else ThreadPoolExecutor(max_workers=1)
+        with pool, progress_bar(total=len(filenames), desc="Analyzing files", disable=args.quiet) as pbar:
+            records = asyncio.run(ingest_batch(filenames, args, pool, lambda record: pbar.update(1)))
+    elif args.jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            chunksize = max(1, min(64, len(filenames) // (args.jobs * 4)))
+            entries = pool.map(analyze_batch_entry, filenames, [args] * len(filenames), chunksize=chunksize)
+            records = list(progress_bar(entries, total=len(filenames), desc="Analyzing files", disable=args.quiet))
+    else:
+        records = [analyze_batch_entry(filename, args) for filename in progress_bar(filenames, desc="Analyzing files", disable=args.quiet)]
+
+    totals = {'triangle_count': 0, 'surface_area_cm2': 0.0, 'volume_cm3': 0.0}
+    for record in records:
+        if record['status'] != 'ok':
+            continue
+        results = record['results']
+        values = results.get('model_properties', results)
+        for key in totals:
+            if key in values:
+                totals[key] += type(totals[key])(values[key])
+
+    summary = {
+        "files": len(records),
+        "succeeded": sum(record['status'] == 'ok' for record in records),
+        "failed": sum(record['status'] != 'ok' for record in records),
+        "total_triangle_count": totals['triangle_count'],
+        "total_surface_area_cm2": f"{totals['surface_area_cm2']:.4f}",
+        "total_volume_cm3": f"{totals['volume_cm3']:.4f}",
+        "elapsed_seconds": round(time.perf_counter() - start, 3)
+    }
+    return records, summary
+
+def print_batch_table(records, summary, args):
+    Console, Table, box = load_rich()
+    console = Console()
+    table = Table(title=f"Batch Analysis: {summary['files']} files", show_header=True, header_style="bold magenta")
+    table.add_column("File", overflow="fold")
+    table.add_column("Triangles", justify="right")
+    table.add_column("Surface Area (cm²)", justify="right")
+    table.add_column("Volume (cm³)", justify="right")
+    table.add_column("Status")
+    for record in records:
+        if record['status'] != 'ok':
+            table.add_row(record['file'], "", "", "", f"[red]{record['error']}[/red]")
+            continue
+        results = record['results']
+        values = results.get('model_properties', results)
+        triangles = values.get('triangle_count')
+        table.add_row(
+            record['file'],
+            f"{triangles:,}" if triangles is not None else "",
+            values.get('surface_area_cm2', ""),
+            values.get('volume_cm3', ""),
+            "ok" if results.get('validation', {}).get('valid', True) else "[yellow]invalid mesh[/yellow]"
+        )
+    console.print(table)
+
+    summary_table = Table(title="Batch Summary", show_header=False, box=box.ROUNDED)
+    summary_table.add_column("Property", style="dim")
+    summary_table.add_column("Value")
+    summary_table.add_row("Files", f"{summary['files']:,}")
+    summary_table.add_row("Succeeded", f"{summary['succeeded']:,}")
+    summary_table.add_row("Failed", f"{summary['failed']:,}")
+    summary_table.add_row("Triangles", f"{summary['total_triangle_count']:,}")
+    summary_table.add_row("Surface Area", f"{summary['total_surface_area_cm2']} cm²")
+    summary_table.add_row("Volume (solid)", f"{summary['total_volume_cm3']} cm³")
+    summary_table.add_row("Elapsed", f"{summary['elapsed_seconds']:.2f} s")
+    console.print(summary_table)
+
+class RequestError(Exception):
+    """A rejected `serve` request; carries the HTTP status code of the response."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class RequestArgumentParser(argparse.ArgumentParser):
+    """CLI parser that reports bad request options as RequestError instead of exiting."""
+    def error(self, message):
+        raise RequestError(message)
+
+# Query parameters a `serve` request may set; all other options come from the serve command line
+REQUEST_OPTIONS = ('calculation', 'unit', 'material', 'infill', 'accuracy', 'mass_properties', 'validate', 'split_bodies', 'weld_tolerance', 'timings')
+REQUEST_FLAGS = ('mass_properties', 'validate', 'split_bodies', 'timings')
+
+def warm_worker(_):
+    """Load NumPy and the STL kernels in a pool process before the first request needs them."""
+    np.zeros(1)
+    stl_facet_dtype()
+    time.sleep(0.05) # keep this process busy so the pool starts the next one
+    return os.getpid()
+
+class AnalysisService:
+    """Runs analyses for the HTTP server in a warm process pool, with a concurrency limit and metrics."""
+    LATENCY_WINDOW = 10000
+
+    def __init__(self, base_argv, pool_size, max_concurrent, max_queue, max_upload_bytes, path_root=None):
+        from concurrent.futures import ProcessPoolExecutor
+        import collections
+        self.parser = build_parser(RequestArgumentParser)
+        self.base_argv = list(base_argv)
+        self.pool_size = pool_size
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_upload_bytes = max_upload_bytes
+        self.path_root = os.path.realpath(path_root) if path_root else None
+        start_shared_memory_tracker()
+        self.pool = ProcessPoolExecutor(max_workers=pool_size)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.in_flight = 0
+        self.counts = {'total': 0, 'succeeded': 0, 'failed': 0, 'rejected': 0}
+        self.latencies = collections.deque(maxlen=self.LATENCY_WINDOW)
+        self.started = time.time()
+
+    def warm_up(self):
+        """Start every pool process and import the analysis stack in it; returns the number of processes."""
+        return len(set(self.pool.map(warm_worker, range(self.pool_size))))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def request_args(self, query, filename):
+        """Parse the serve defaults plus the request's query options exactly like the CLI would."""
+        argv = list(self.base_argv)
+        for key, values in query.items():
+            option = key.replace('-', '_')
+            if option not in REQUEST_OPTIONS:
+                raise RequestError(f"unknown option {key!r}; allowed: {', '.join(REQUEST_OPTIONS)}")
+            flag = '--' + option.replace('_', '-')
+            for value in values:
+                if option not in REQUEST_FLAGS:
+                    argv.append(f"{flag}={value}")
+                elif value.lower() in ('', '1', 'true', 'yes'):
+                    argv.append(flag)
+        args = self.parser.parse_args(argv + ['--output-format', 'json', '--quiet', '--', filename])
+        check_args(self.parser, args)
+        if args.filetype != 'stl':
+            raise RequestError("the service analyzes STL files only")
+        return args
+
+    def run(self, args, path, upload=None):
+        """Analyze one file in the pool once a concurrency slot is free; returns (status, body).
+
+        `upload` reads the request body into a shared memory segment and returns it with
+        its length. It runs only after the request got a place in the queue, so rejected
+        requests never buffer their body.
+        """
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                self.counts['rejected'] += 1
+                raise RequestError("server busy, try again later", 503)
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+        segment = None
+        try:
+            if upload is not None:
+                segment, length = upload()
+            self.slots.acquire()
+        except BaseException:
+            if segment is not None:
+                release_shared(segment)
+            with self.lock:
+                self.waiting -= 1
+            raise
+        with self.lock:
+            self.waiting -= 1
+            self.in_flight += 1
+        try:
+            if segment is None:
+                record = self.pool.submit(analyze_batch_entry, path, args).result()
+            else:
+                record = self.pool.submit(analyze_shared_entry, path, args, segment.name, length).result()
+        finally:
+            if segment is not None:
+                release_shared(segment)
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+        if record['status'] != 'ok':
+            return 422, {"error": record['error']}
+        results = record['results']
+        if 'timings' in record:
+            results['timings'] = record['timings']
+        return 200, results
+
+    def handle_analyze(self, query, headers, stream):
+        """POST /analyze: the STL file as request body, or ?path= for a file under --allow-path-root."""
+        path = query.pop('path', [None])[-1]
+        name = os.path.basename(query.pop('name', ['upload.stl'])[-1]) or 'upload.stl'
+        if path is not None:
+            if self.path_root is None:
+                raise RequestError("file paths are disabled; start the server with --allow-path-root", 403)
+            path = os.path.realpath(path)
+            if os.path.commonpath([path, self.path_root]) != self.path_root:
+                raise RequestError("path is outside --allow-path-root", 403)
+            if not os.path.isfile(path):
+                raise RequestError(f"no such file: {path}", 404)
+            return self.run(self.request_args(query, path), path)
+
+        length = int(headers.get('Content-Length') or 0)
+        if length <= 0:
+            raise RequestError("empty request; POST the STL file as the body or pass ?path=")
+        if length > self.max_upload_bytes:
+            raise RequestError(f"upload larger than {self.max_upload_bytes} bytes", 413)
+        args = self.request_args(query, name)
+
+        def upload():
+            # The upload reaches the worker through shared memory, like prefetched batch files; nothing touches the disk
+            segment = create_shared(length)
+            try:
+                if read_into(stream, segment.buf, length) < length:
+                    raise RequestError("upload ended before Content-Length bytes")
+            except BaseException:
+                release_shared(segment)
+                raise
+            return segment, length
+        return self.run(args, name, upload)
+
+    def record(self, status, seconds):
+        with self.lock:
+            self.counts['total'] += 1
+            if status == 200:
+                self.counts['succeeded'] += 1
+                self.latencies.append(seconds)
+            elif status != 503:
+                self.counts['failed'] += 1
+
+    def metrics(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics = {
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "pool_size": self.pool_size,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "peak_queue_depth": self.peak_waiting,
+                "requests": dict(self.counts),
+            }
+
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 3) if latencies else None
+
+        metrics["latency_ms"] = {"window": len(latencies), "p50": percentile(0.50), "p99": percentile(0.99), "max": percentile(1.0)}
+        return metrics
+
+def make_request_handler(service, access_log=True):
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, urlsplit
+
+    class AnalysisRequestHandler(BaseHTTPRequestHandler):
+        server_version = f"volume-calculator/{__version__}"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/metrics':
+                self.send_json(200, service.metrics())
+            elif url.path == '/healthz':
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(404, {"error": f"unknown endpoint {url.path}"})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != '/analyze':
+                self.send_json(404, {"error": f"unknown endpoint {url.path}"})
+                return
+            start = time.perf_counter()
+            try:
+                status, body = service.handle_analyze(parse_qs(url.query, keep_blank_values=True), self.headers, self.rfile)
+            except RequestError as e:
+                status, body = e.status, {"error": str(e)}
+            except Exception as e:
+                status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+            service.record(status, time.perf_counter() - start)
+            self.send_json(status, body)
+
+        def send_json(self, status, body):
+            payload = (json.dumps(body, indent=4) + "\n").encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if status == 503:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            if access_log:
+                super().log_message(format, *args)
+
+    return AnalysisRequestHandler
+
+def serve_main(argv):
+    """`volume-calculator serve`: HTTP analysis service backed by a warm process pool."""
     parser = argparse.ArgumentParser(
-        description='Calculate properties of 3D models. By default, calculates all properties for all materials.',
+        prog='volume-calculator serve',
+        description='Serve STL analyses over HTTP.\n\n'
+                    '  POST /analyze          STL file as the request body (?name=part.stl sets the reported filename)\n'
+                    '  POST /analyze?path=... file on the server, only below --allow-path-root\n'
+                    '  GET  /metrics          request counts, queue depth and p50/p99 latency\n\n'
+                    f'Query parameters set per-request options: {", ".join(REQUEST_OPTIONS)}.\n'
+                    'Any other volume-calculator option given here (e.g. --materials-file, --cache-dir)\n'
+                    'becomes the default for every request. Responses use the --output-format json schema.',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1).')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765).')
+    parser.add_argument('--pool-size', type=int, default=os.cpu_count() or 1, help='Worker processes kept warm for analyses (default: CPU count).')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='Analyses running at once (default: --pool-size).')
+    parser.add_argument('--max-queue', type=int, default=64, help='Requests allowed to wait for a slot before new ones get 503 (default: 64).')
+    parser.add_argument('--max-upload-mb', type=float, default=1024.0, help='Largest accepted upload in MB (default: 1024).')
+    parser.add_argument('--allow-path-root', default=None, metavar='DIR', help='Allow ?path= requests for files below DIR.')
+    parser.add_argument('--no-access-log', action='store_true', help='Do not log every request to stderr.')
+    serve_args, base_argv = parser.parse_known_args(argv)
+    if serve_args.pool_size < 1 or (serve_args.max_concurrent is not None and serve_args.max_concurrent < 1):
+        parser.error("--pool-size and --max-concurrent must be at least 1.")
+    if serve_args.max_queue < 0:
+        parser.error("--max-queue must not be negative.")
+
+    service = AnalysisService(
+        base_argv, serve_args.pool_size, serve_args.max_concurrent or serve_args.pool_size, serve_args.max_queue,
+        int(serve_args.max_upload_mb * 1e6), serve_args.allow_path_root
+    )
+    try:
+        service.request_args({}, 'probe.stl') # reject bad default options at startup
+    except RequestError as e:
+        service.close()
+        parser.error(str(e))
+
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((serve_args.host, serve_args.port), make_request_handler(service, not serve_args.no_access_log))
+    started = service.warm_up()
+    print(f"Serving on http://{serve_args.host}:{server.server_port} with {started} warm worker processes", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    """The command-line parser; `serve` reuses it to read per-request options."""
+    parser = parser_class(
+        description='Calculate properties of 3D models. By default, calculates all properties for all materials.\n'
+                    'Run "volume-calculator serve --help" for the HTTP service.',
         formatter_class=argparse.RawTextHelpFormatter
     )
-    parser.add_argument('filename', nargs='?', default=None, help='Path to the input file (STL, NIfTI, DICOM).')
+    parser.add_argument(
+        'filenames', nargs='*', metavar='filename',
+        help='Path to the input file (STL, NIfTI, or a DICOM series directory).\nSeveral files, directories (searched recursively) and glob patterns run in batch mode.'
+    )
     parser.add_argument(
         '--calculation', choices=['volume', 'area'], default=None,
         help='Optimize by running a single calculation.'
     )
     parser.add_argument('--unit', choices=['cm', 'inch'], default='cm', help='Unit for volume display (default: cm).')
     parser.add_argument(
-        '--material', type=int, choices=range(1, 22), default=1,
-        help='Material ID for specific mass calculation (default: 1, PLA).'
+        '--material', default=None,
+        help='Material ID or name for specific mass calculation (default: the first material of the catalog, 1 PLA).'
+    )
+    parser.add_argument(
+        '--materials-file', default=None, metavar='PATH',
+        help='Material catalog (JSON, CSV or TOML file, or a directory of them) to use instead of the built-in list. '
+             'Defaults to $VOLUME_CALCULATOR_MATERIALS.'
     )
     parser.add_argument(
         '--infill', type=float, default=20.0,
@@ -211,161 +2335,212 @@ def main():
     parser.add_argument('--filetype', choices=['stl', 'nii', 'dcm'], default='stl', help='Type of the input file (default: stl).')
     parser.add_argument('--output-format', choices=['table', 'json'], default='table', help='Output format (default: table).')
     parser.add_argument('--list-materials', action='store_true', help='List all available materials and exit.')
+    parser.add_argument('--quiet', action='store_true', help='Do not draw progress bars (they are also off when stderr is not a terminal).')
+    parser.add_argument('--timings', action='store_true', help='Report time per stage, bytes read, facets and peak memory (a "timings" block in JSON output).')
+    parser.add_argument('--profile', default=None, metavar='PATH', help='Write a cProfile (pstats) dump of the run to PATH.')
+    parser.add_argument('--trace', default=None, metavar='PATH', help='Write the stage timings as a Chrome trace-event file to PATH.')
+    parser.add_argument('--mmap', action='store_true', help='Memory-map binary STL files instead of reading them into RAM.')
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Parallel workers: processes for binary STL facet ranges, threads for DICOM slice decoding (default: 1).'
+    )
+    parser.add_argument(
+        '--accuracy', choices=ACCURACY_MODES, default='standard',
+        help='Summation accuracy: standard, or high to recenter vertices before summing (default: standard).'
+    )
+    parser.add_argument(
+        '--mass-properties', action='store_true',
+        help='Full analysis: also report centre of mass and inertia tensor in the --material selected.'
+    )
+    parser.add_argument(
+        '--validate', action='store_true',
+        help='Check that the mesh is watertight, manifold and consistently oriented before trusting its volume.'
+    )
+    parser.add_argument(
+        '--split-bodies', action='store_true',
+        help='Report triangle count, bounds, area, volume and mass of every separate body in the file.'
+    )
+    parser.add_argument(
+        '--weld-tolerance', type=float, default=WELD_TOLERANCE_MM,
+        help=f'Distance in mm below which vertices are merged for --validate and --split-bodies (default: {WELD_TOLERANCE_MM}).'
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=os.cpu_count() or 1,
+        help='Number of files analyzed concurrently in batch mode (default: CPU count).'
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=8,
+        help='Batch mode: STL files read concurrently ahead of the --jobs workers so I/O overlaps with analysis; 0 disables (default: 8).'
+    )
+    parser.add_argument(
+        '--prefetch-mb', type=float, default=512.0,
+        help='Batch mode: memory for files read ahead; larger files are streamed by their worker (default: 512).'
+    )
+    parser.add_argument(
+        '--cache-dir', default=None,
+        help='Directory of the persistent result cache (default: $VOLUME_CALCULATOR_CACHE_DIR, caching off if unset).'
+    )
+    parser.add_argument('--no-cache', action='store_true', help='Disable the result cache for this run.')
+    parser.add_argument(
+        '--cache-max-entries', type=int, default=10000,
+        help='Maximum cached results kept before least recently used entries are evicted (default: 10000).'
+    )
+    parser.add_argument('--cache-stats', action='store_true', help='Show result cache statistics and exit.')
+    parser.add_argument(
+        '--threshold', type=float, default=None,
+        help='NIfTI/DICOM: voxels with a value above this threshold are measured (default: 0).'
+    )
+    parser.add_argument(
+        '--label', type=int, action='append', default=None,
+        help='NIfTI/DICOM: measure voxels with this label value instead of thresholding. Repeat for several labels.'
+    )
+    parser.add_argument(
+        '--volume-index', type=int, default=0,
+        help='NIfTI: volume of a 4D image to measure (default: 0).'
+    )
+    parser.add_argument(
+        '--surface', action='store_true',
+        help='NIfTI/DICOM: extract the iso-surface with marching cubes and report its triangle count and area.'
+    )
+    parser.add_argument(
+        '--export-stl', default=None, metavar='PATH',
+        help='NIfTI/DICOM: write the extracted iso-surface to a binary STL file (implies --surface).'
+    )
+
+    return parser
 
-    args = parser.parse_args()
-    materials = materialsFor3DPrinting()
+def check_args(parser, args):
+    """Validate parsed options and resolve --material to an id; returns the material catalog."""
+    try:
+        materials = open_material_catalog(args)
+    except (OSError, ValueError, KeyError, TypeError, ModuleNotFoundError) as e:
+        parser.error(f"cannot load material catalog: {e}")
+    try:
+        args.material = materials.resolve(args.material) if args.material is not None else materials.id_list[0]
+    except (KeyError, ValueError) as e:
+        parser.error(f"--material: {e.args[0]}")
 
     if not 0.0 <= args.infill <= 100.0:
         parser.error("Infill percentage must be between 0 and 100.")
 
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
+    if args.prefetch < 0 or args.prefetch_mb < 0:
+        parser.error("--prefetch and --prefetch-mb must not be negative.")
+
+    if args.cache_max_entries < 1:
+        parser.error("--cache-max-entries must be at least 1.")
+    return materials
+
+def main():
+    argv = sys.argv[1:]
+    if argv[:1] == ['serve']:
+        return serve_main(argv[1:])
+    parser = build_parser()
+    args = parser.parse_intermixed_args(argv)
+    materials = check_args(parser, args)
+
     if args.list_materials:
         materials.list_materials(args.output_format)
         sys.exit(0)
 
-    if not args.filename:
+    if args.cache_stats:
+        cache = open_result_cache(args)
+        if cache is None:
+            parser.error("--cache-stats requires --cache-dir or $VOLUME_CALCULATOR_CACHE_DIR.")
+        cache_stats = cache.stats()
+        if args.output_format == 'json':
+            print(json.dumps(cache_stats, indent=4))
+        else:
+            Console, Table, box = load_rich()
+            table = Table(title="Result Cache", show_header=False, box=box.ROUNDED)
+            table.add_column("Property", style="dim")
+            table.add_column("Value")
+            for name, value in cache_stats.items():
+                table.add_row(name.replace('_', ' ').capitalize(), str(value))
+            Console().print(table)
+        sys.exit(0)
+
+    if not args.filenames:
         parser.error("A filename is required unless --list-materials is used.")
 
-    is_full_analysis_mode = args.calculation is None
+    configure_instrumentation(args)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run_analysis(args, parser)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.trace:
+            write_trace(args.trace, STAGE_TIMER.take_events())
 
-    if args.filetype == 'stl':
-        mySTLUtils = STLUtils()
-        mySTLUtils.loadSTL(args.filename)
-        bbox = mySTLUtils.bounding_box_cm
-        results = {}
-
-        if is_full_analysis_mode:
-            # --- FULL ANALYSIS MODE (DEFAULT) ---
-            volume_cm3 = mySTLUtils.calculate_volume()
-            area_cm2 = mySTLUtils.calculate_surface_area()
-            
-            adjusted_volume_cm3 = volume_cm3 * (args.infill / 100.0)
-
-            results = {
-                "file_information": {
-                    "filename": os.path.basename(args.filename),
-                    "file_size_kb": f"{mySTLUtils.file_size / 1024:.2f}"
-                },
-                "model_properties": {
-                    "triangle_count": mySTLUtils.triangle_count,
-                    "bounding_box_cm": {
-                        "width": f"{bbox['width']:.2f}",
-                        "depth": f"{bbox['depth']:.2f}",
-                        "height": f"{bbox['height']:.2f}"
-                    },
-                    "surface_area_cm2": f"{area_cm2:.4f}",
-                    "volume_cm3": f"{volume_cm3:.4f}",
-                    "volume_inch3": f"{mySTLUtils.cm3_to_inch3(volume_cm3):.4f}"
-                },
-                "mass_estimates": []
-            }
-            
-            for mat_id, mat_info in materials.materials_dict.items():
-                mass_infill = mySTLUtils.calculate_mass(adjusted_volume_cm3, mat_info['mass'])
-                mass_solid = mySTLUtils.calculate_mass(volume_cm3, mat_info['mass'])
-                # MODIFIED: Changed to a more structured and explicit JSON format
-                results["mass_estimates"].append({
-                    "id": mat_id,
-                    "name": mat_info['name'],
-                    "density_g_cm3": mat_info['mass'],
-                    "mass_at_infill": {
-                        "infill_percent": args.infill,
-                        "mass_g": f"{mass_infill:.3f}"
-                    },
-                    "mass_at_100_infill": {
-                        "infill_percent": 100.0,
-                        "mass_g": f"{mass_solid:.3f}"
-                    }
-                })
+def run_analysis(args, parser):
+    """Analyze the files named on the command line and print the results."""
+    if args.filetype == 'dcm':
+        # Each DICOM input is a series directory
+        is_batch_mode = len(args.filenames) > 1
+    else:
+        is_batch_mode = len(args.filenames) > 1 or any(os.path.isdir(path) or glob.has_magic(path) for path in args.filenames)
 
+    if is_batch_mode:
+        if args.filetype == 'dcm':
+            filenames = list(dict.fromkeys(args.filenames))
         else:
-            # --- SPECIFIC CALCULATION MODE ---
-            results = {"file": args.filename, "calculation": args.calculation, "bounding_box_cm": bbox}
-            if args.calculation == 'volume':
-                volume_cm3 = mySTLUtils.calculate_volume()
-                adjusted_volume_cm3 = volume_cm3 * (args.infill / 100.0)
-                material_info = materials.get_material_info(args.material)
-
-                mass_g_infill = mySTLUtils.calculate_mass(adjusted_volume_cm3, material_info['mass'])
-                mass_g_solid = mySTLUtils.calculate_mass(volume_cm3, material_info['mass'])
-                
-                # MODIFIED: Changed to a more structured and explicit JSON format
-                results.update({
-                    "volume_cm3": f"{volume_cm3:.4f}",
-                    "volume_inch3": f"{mySTLUtils.cm3_to_inch3(volume_cm3):.4f}",
-                    "material_name": material_info['name'],
-                    "mass_at_infill": {
-                        "infill_percent": args.infill,
-                        "mass_g": f"{mass_g_infill:.3f}"
-                    },
-                    "mass_at_100_infill": {
-                        "infill_percent": 100.0,
-                        "mass_g": f"{mass_g_solid:.3f}"
-                    }
-                })
-            elif args.calculation == 'area':
-                area_cm2 = mySTLUtils.calculate_surface_area()
-                results["surface_area_cm2"] = f"{area_cm2:.4f}"
+            filenames = expand_input_paths(args.filenames, BATCH_EXTENSIONS[args.filetype])
+        if not filenames:
+            parser.error("No input files matched.")
+        records, summary = run_batch(filenames, args)
+        for record in records:
+            STAGE_TIMER.events.extend(record.pop("trace_events", ()))
+        with STAGE_TIMER.stage('render'):
+            if args.output_format == 'json':
+                print(json.dumps({"results": records, "summary": summary}, indent=4))
+            else:
+                print_batch_table(records, summary, args)
+        if summary['failed']:
+            sys.exit(1)
+
+    else:
+        STAGE_TIMER.reset()
+        try:
+            results = analyze_file(args.filenames[0], args, show_progress=not args.quiet)
+        except Exception as e:
+            print(f"Error loading {args.filetype.upper()} file: {e}")
+            sys.exit(1)
 
         # --- OUTPUT HANDLING ---
         if args.output_format == 'json':
-            print(json.dumps(results, indent=4))
+            if args.timings:
+                results["timings"] = STAGE_TIMER.report()
+            with STAGE_TIMER.stage('render'):
+                print(json.dumps(results, indent=4))
         else:
-            console = Console()
-            if is_full_analysis_mode:
-                props = results['model_properties']
-                info_table = Table(title=f"Model Analysis: {results['file_information']['filename']}", show_header=False, header_style="bold cyan", box=rich.box.ROUNDED)
-                info_table.add_column("Property", style="dim")
-                info_table.add_column("Value")
-                info_table.add_row("File Size", f"{results['file_information']['file_size_kb']} KB")
-                info_table.add_row("Triangles", f"{props['triangle_count']:,}")
-                bbox_str = f"W: {props['bounding_box_cm']['width']}, D: {props['bounding_box_cm']['depth']}, H: {props['bounding_box_cm']['height']}"
-                info_table.add_row("Bounding Box (cm)", bbox_str)
-                info_table.add_row("Surface Area", f"{props['surface_area_cm2']} cm²")
-                volume_display = f"{props['volume_inch3']} inch³" if args.unit == 'inch' else f"{props['volume_cm3']} cm³"
-                info_table.add_row(f"Volume (solid)", volume_display)
-                console.print(info_table)
-
-                mass_table = Table(title="Mass Estimates for All Materials With selected infill and 100% infill", show_header=True, header_style="bold magenta")
-                mass_table.add_column("ID", style="dim", width=4)
-                mass_table.add_column("Material Name")
-                mass_table.add_column("Density", justify="right")
-                mass_table.add_column(f"Mass @ {args.infill:.1f}% (g)", justify="right")
-                mass_table.add_column("Mass @ 100% (g)", justify="right")
-                
-                # MODIFIED: Accessing data from the new structure for the table
-                for item in results['mass_estimates']:
-                    mass_table.add_row(
-                        str(item['id']), 
-                        item['name'], 
-                        f"{item['density_g_cm3']:.3f}", 
-                        item['mass_at_infill']['mass_g'],
-                        item['mass_at_100_infill']['mass_g']
-                    )
-                console.print(mass_table)
-            else: # Specific calculation table
-                if args.calculation == 'volume':
-                    table = Table(title="Volume & Mass Calculation", show_header=False, box=rich.box.ROUNDED)
-                    table.add_column("Property", style="dim")
-                    table.add_column("Value")
-                    table.add_row("Bounding Box (cm)", f"W: {bbox['width']:.2f}, D: {bbox['depth']:.2f}, H: {bbox['height']:.2f}")
-                    volume_display = f"{results['volume_inch3']} inch³" if args.unit == 'inch' else f"{results['volume_cm3']} cm³"
-                    table.add_row("Volume (solid)", volume_display)
-                    table.add_row("Material", f"{results['material_name']} (ID: {args.material})")
-                    # MODIFIED: Accessing data from the new structure for the table
-                    table.add_row(f"Mass ({args.infill:.1f}% Infill)", f"{results['mass_at_infill']['mass_g']} g")
-                    table.add_row("Mass (100% Infill)", f"{results['mass_at_100_infill']['mass_g']} g")
-                    console.print(table)
-                elif args.calculation == 'area':
-                    table = Table(title="Surface Area Calculation", show_header=False, box=rich.box.ROUNDED)
-                    table.add_column("Property", style="dim")
-                    table.add_column("Value")
-                    table.add_row("Bounding Box (cm)", f"W: {bbox['width']:.2f}, D: {bbox['depth']:.2f}, H: {bbox['height']:.2f}")
-                    table.add_row("Surface Area", f"{results['surface_area_cm2']} cm²")
-                    console.print(table)
-
-    elif args.filetype in ['nii', 'dcm']:
-        console = Console()
-        console.print("[yellow]Warning: NIfTI and DICOM support is limited to specific calculations only.[/yellow]")
+            with STAGE_TIMER.stage('render'):
+                print_results_table(results, args)
+            if args.timings:
+                print_timings_table(STAGE_TIMER.report())
+
+def print_timings_table(timings):
+    Console, Table, box = load_rich()
+    table = Table(title=f"Timings ({timings['total_seconds'] * 1000:.1f} ms total)", show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    table.add_column("Stage")
+    table.add_column("Calls", justify="right")
+    table.add_column("ms", justify="right")
+    for name, stage in sorted(timings['stages'].items(), key=lambda item: -item[1]['seconds']):
+        table.add_row(name, str(stage['calls']), f"{stage['seconds'] * 1000:.2f}")
+    for key in ('bytes_read', 'facets', 'mb_per_s', 'facets_per_s', 'peak_rss_mb', 'peak_rss_children_mb'):
+        if key in timings:
+            table.add_row(key.replace('_', ' '), "", f"{timings[key]:,}")
+    Console().print(table)
 
 if __name__ == '__main__':
     main()